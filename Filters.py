@@ -1,5 +1,6 @@
 # Filters.py
 
+import array
 import math
 
 class BiquadType:
@@ -96,12 +97,205 @@ class Biquad:
             self.b1 = 2 * (K * K - 1) * norm
             self.b2 = (1 - math.sqrt(2) * K + K * K) * norm
 
+    def prime(self, value):
+        """
+        Set the filter state as if it had settled on a constant input of value.
+        Avoids a ramp from zero when a new filter takes over a running signal.
+        """
+        self.z2 = value * (self.a2 - self.b2)
+        self.z1 = value * (self.a1 - self.b1) + self.z2
+
     def process(self, value):
         out = value * self.a0 + self.z1
         self.z1 = value * self.a1 + self.z2 - self.b1 * out
         self.z2 = value * self.a2 - self.b2 * out
         return out
 
+class MovingAverage:
+    """
+    Running-sum moving average over the last `window` samples.
+    Costs one add and one subtract per sample whatever the window length; the samples live in a
+    preallocated circular array, so nothing is allocated while filtering.
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self._buffer = array.array("l", [0] * window)
+        self._index = 0
+        self._filled = 0
+        self._sum = 0
+
+    def process(self, value):
+        """
+        Add one integer sample and return the average of the samples in the window.
+        """
+        buffer = self._buffer
+        index = self._index
+        self._sum += value - buffer[index]
+        buffer[index] = value
+        self._index = index + 1 if index + 1 < self.window else 0
+        if self._filled < self.window:
+            self._filled += 1
+        return self._sum / self._filled
+
+    def process_block(self, samples):
+        """
+        Run a block of samples (e.g. one burst from the ADC) through the filter.
+        :return: The average after the last sample, or None for an empty block.
+        """
+        out = None
+        for value in samples:
+            out = self.process(value)
+        return out
+
+    def reset(self):
+        for i in range(self.window):
+            self._buffer[i] = 0
+        self._index = 0
+        self._filled = 0
+        self._sum = 0
+
+
+class CIC:
+    """
+    Integer cascaded integrator-comb decimator: `stages` integrators at the input rate, then
+    decimation by `decimation` and `stages` combs with a differential delay of `delay`.
+    Only additions and subtractions, and the cost per sample does not depend on the decimation.
+
+    The output carries a gain of (decimation * delay) ** stages (see `gain`). The registers
+    wrap at `register_bits`, which is sized so the wrap-around cancels out in the combs.
+    """
+
+    def __init__(self, decimation, stages=3, delay=1, input_bits=24):
+        if decimation < 1 or stages < 1 or delay < 1:
+            raise ValueError("decimation, stages and delay must be at least 1")
+        self.decimation = decimation
+        self.stages = stages
+        self.delay = delay
+        self.gain = (decimation * delay) ** stages
+        self.register_bits = input_bits + (self.gain - 1).bit_length()
+        self._mask = (1 << self.register_bits) - 1
+        self._integrators = [0] * stages
+        # One circular delay line of `delay` entries per comb stage, stored back to back
+        self._comb_delays = [0] * (stages * delay)
+        self._comb_index = 0
+        self._count = 0
+
+    def process(self, value):
+        """
+        Add one integer sample.
+        :return: The decimated output (scaled by gain) once every `decimation` samples, otherwise None.
+        """
+        mask = self._mask
+        integrators = self._integrators
+        for i in range(self.stages):
+            value = (value + integrators[i]) & mask
+            integrators[i] = value
+
+        self._count += 1
+        if self._count < self.decimation:
+            return None
+        self._count = 0
+
+        delays = self._comb_delays
+        offset = self._comb_index
+        for i in range(self.stages):
+            slot = i * self.delay + offset
+            previous = delays[slot]
+            delays[slot] = value
+            value = (value - previous) & mask
+        self._comb_index = offset + 1 if offset + 1 < self.delay else 0
+        return value
+
+    def process_block(self, samples):
+        """
+        Run a block of samples through the decimator.
+        :return: The last output produced by the block, or None if the block completed no output.
+        """
+        out = None
+        for value in samples:
+            result = self.process(value)
+            if result is not None:
+                out = result
+        return out
+
+    def reset(self):
+        for i in range(self.stages):
+            self._integrators[i] = 0
+        for i in range(len(self._comb_delays)):
+            self._comb_delays[i] = 0
+        self._comb_index = 0
+        self._count = 0
+
+
+# Decimation modes supported by Oversampler
+OVERSAMPLE_MODES = ("average", "cic")
+
+class Oversampler:
+    """
+    Oversample-and-decimate stage between an input and the filter chain.
+    Turns N raw samples into one output on the same scale as the input, with 0.5 * log2(N) extra
+    bits of resolution when the input carries at least 1 LSB of noise:
+    "average" returns the plain mean of each block of N samples, "cic" a CIC-decimated value,
+    which rejects more out-of-band noise at the cost of a few outputs of latency.
+    The output is a float so the extra resolution survives until the final HID scaling.
+    """
+
+    def __init__(self, samples, mode="average", stages=3):
+        if samples < 1:
+            raise ValueError("samples must be at least 1")
+        if mode not in OVERSAMPLE_MODES:
+            raise ValueError(f"unknown oversample mode {mode}")
+        self.samples = samples
+        self.mode = mode
+        self._cic = CIC(samples, stages) if mode == "cic" else None
+        self._sum = 0
+        self._count = 0
+
+    def add(self, value):
+        """
+        Add one raw sample.
+        :return: The decimated output once every N samples, otherwise None.
+        """
+        if self._cic is not None:
+            out = self._cic.process(int(value))
+            return None if out is None else out / self._cic.gain
+
+        self._sum += value
+        self._count += 1
+        if self._count < self.samples:
+            return None
+        out = self._sum / self.samples
+        self._sum = 0
+        self._count = 0
+        return out
+
+    def add_block(self, samples):
+        """
+        Add a block of raw samples, e.g. one ADC burst.
+        :return: The newest output completed by the block, or None.
+        """
+        out = None
+        for value in samples:
+            result = self.add(value)
+            if result is not None:
+                out = result
+        return out
+
+    def reset(self):
+        if self._cic is not None:
+            self._cic.reset()
+        self._sum = 0
+        self._count = 0
+
+    def effective_bits(self, bits):
+        """
+        Resolution after decimation for an input of the given bit depth.
+        """
+        return bits + 0.5 * math.log(self.samples) / math.log(2)
+
 # Example usage
 # if __name__ == "__main__":
 #     # Create a low-pass filter with a cutoff frequency of 0.1, Q factor of 0.707, and no peak gain
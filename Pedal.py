@@ -1,119 +1,346 @@
+import time
 from UtilLibrary import UtilLib
-from Filters import Biquad, BiquadType
-from adafruit_ads1x15.ads1115 import ADS1115
-from simple import Gamepad # custom gamepad descriptor
-from adafruit_hx711.hx711 import HX711
-from adafruit_hx711.analog_in import AnalogIn
+from PedalPipeline import PedalPipeline
+from Filters import Oversampler
+from input_backends import AnalogInput, BurstAnalogInput, LoadCellInput, ADSInput
+from bit_utils import get_bit_depth
+from boot_trace import boot_trace
 
-
-# Filters for smoothing pedal inputs
-_brakeFilter = Biquad(BiquadType.LOWPASS, 0.2, 0.5, 0.0)
-_clutchFilter = Biquad(BiquadType.LOWPASS, 0.2, 0.5, 0.0)
-_throttleFilter = Biquad(BiquadType.LOWPASS, 0.2, 0.5, 0.0)
+utilLib = UtilLib()
 
 
 class Pedal:
-    def __init__(self, prefix, i2c, gamepad):
+    def __init__(self, prefix, i2c, gamepad, name=None, storagehelper=None):
         self._prefix = prefix
+        self._name = name
         self._raw_bit = 65535
         self._hid_bit = 65535
         self._serial_range = 100
         self._afterHID = 0
-        self._signal = None
-        self._loadCell = None
-        self._ads1015 = ADS1115(i2c)
-        self._channel = None
-        self._analogInput = None
+        self._i2c = i2c
+        # Input backend (see input_backends), chosen once when the input is configured
+        self.backend = None
+        self._read_into = self._no_input
+        self._buffer = None
         self._inverted = False
         self._smooth = False
+        self._filterConfig = None
+        self._oversampler = None
         self._inputMap = [0, 20, 40, 60, 80, 100]
         self._outputMap = [0, 20, 40, 60, 80, 100]
         self._calibration = [0, self._raw_bit, 0, self._raw_bit]
-        self._pedalString = ""
+        self._rawValue = 0
+        self._filteredValue = 0
+        self._pedalOutput = 0
+        self._beforeHID = 0
+        self._readTime = 0
+        self.timed = False  # Measure read_values duration for telemetry
+        self._mailbox = None
+        self._slot = 0
         self._gamepad = gamepad
+        self.storagehelper = storagehelper
 
         # Preload configuration from storage
         self.preload_cache()
+        self.rebuild_curve()
+        boot_trace.mark(f"pedal.{name}.init")
 
     # Configuration methods
     def set_bits(self, rawBit, hidBit):
         self._raw_bit = rawBit
         self._hid_bit = hidBit
+        if self.backend:
+            self.backend.set_bits(rawBit.bit_length())
+        self.rebuild_curve()
 
-    def config_analog(self, analogInput):
-        self._analogInput = analogInput
-        self._signal = 0
+    def config_analog(self, pin, burst=None):
+        """
+        Read the on-chip ADC.
+        :param pin: Pin name of an ADC-capable pin, e.g. "GP26".
+        :param burst: Optional {"samples": N, "rate": Hz} to sample in DMA bursts through analogbufio;
+                      each burst is handed to the oversampling stage as one block.
+        """
+        if burst:
+            self.use_backend(BurstAnalogInput(pin, self._raw_bit.bit_length(), int(burst.get("samples", 64)),
+                                              int(burst.get("rate", 100000))))
+        else:
+            self.use_backend(AnalogInput(pin, self._raw_bit.bit_length()))
 
-    def config_load_cell(self, DOUT, CLK):
-        if not self._loadCell:
-            self._loadCell = HX711(DOUT, CLK)
-            self._loadCell.set_scale(-7050.0)
-            self._loadCell.tare(10)
-        self._signal = 1
+    def config_load_cell(self, DOUT, CLK, tare_samples=10, driver="gpio", rate=80, tare=None):
+        """
+        Read an HX711. Load cells that share a CLK pin are clocked together, so a second
+        load cell on the same clock costs almost nothing extra.
+        :param driver: "gpio" to clock the HX711 from the CPU, or "pio" to run the clocking in a
+                       PIO state machine (falls back to "gpio" when rp2pio or adafruit_pioasm is missing).
+        :param rate: Conversions per second selected with the HX711 RATE pin.
+        :param tare: The stored tare offset; the cell is only tared (and the offset stored) without one.
+        """
+        channel = None
+        if driver == "pio":
+            try:
+                channel = boot_trace.import_module("hx711_pio").create(DOUT, CLK)
+            except ImportError as e:
+                print(f"{self._name}: {e}, using GPIO clocking")
+        if not channel:
+            hx711_multi = boot_trace.import_module("hx711_multi")
+            channel = hx711_multi.get_channel(DOUT, CLK)
+        backend = LoadCellInput(channel, tare_samples, rate, tare)
+        self.use_backend(backend)
+        if tare is None and backend.tare_value is not None:
+            self.storagehelper.write_record(f"{self._name}.tare", backend.tare_value)
+
+    def tare(self):
+        """
+        Zero the load cell again and store the new offset.
+        :raises ValueError: If the pedal has no load cell or it does not respond.
+        """
+        backend = self.backend
+        if backend is None or backend.input_type != "Loadcell":
+            raise ValueError("not a load cell")
+        value = backend.tare(backend.tare_samples)
+        if value is None:
+            raise ValueError("load cell not responding")
+        self.storagehelper.write_record(f"{self._name}.tare", value)
+
+    def config_ads(self, channel, address=0x48):
+        """
+        Read a single-ended input of an ADS1115. Pedals on the same device share its driver,
+        which converts their channels in turn (see ads_devices).
+        """
+        if not isinstance(channel, int) or not 0 <= channel <= 3:
+            raise ValueError(f"invalid ADS channel {channel}")
+        if self._i2c is None:
+            raise ValueError("I2C is not initialized")
+        device = boot_trace.import_module("ads_devices").get_device(self._i2c, address)
+        self.use_backend(ADSInput(device, channel))
+
+    def use_backend(self, backend):
+        """
+        Select the input backend, replacing the current one. read_values() then reads it with one
+        read_into() call, whatever kind of input it is.
+        :param backend: Any object implementing the input_backends protocol, e.g. a SimulatedInput.
+        """
+        if self.backend is not None and self.backend is not backend:
+            self.release_input()
+        backend.set_bits(self._raw_bit.bit_length())
+        backend.start()
+        self.backend = backend
+        self._read_into = backend.read_into
+        self._buffer = backend.buffer
+
+    @staticmethod
+    def _no_input(buffer):
+        raise ValueError("Invalid signal configuration or missing input.")
+
+    @property
+    def degraded(self):
+        """True while the input fails and the pedal holds its last value."""
+        return self.backend is not None and self.backend.degraded
+
+    def attach_mailbox(self, mailbox, slot):
+        """
+        Publish every processed value, with its sample time, into a mailbox slot.
+        """
+        self._mailbox = mailbox
+        self._slot = slot
 
-    def config_ads(self, channel):
-        self._channel = channel
-        self._signal = 2
+    def release_input(self):
+        """
+        Drop the current input backend so a new one can be configured.
+        """
+        if self._oversampler:
+            self._oversampler.reset()
+        if self.backend:
+            self.backend.deinit()
+        self.backend = None
+        self._read_into = self._no_input
+        self._buffer = None
+
+    def compile_pipeline(self, profile=None):
+        """
+        Compile a ready-to-run pipeline for this pedal.
+        :param profile: Optional profile dictionary; missing keys fall back to the pedal's own settings.
+        """
+        base = PedalPipeline(self._raw_bit, self._hid_bit, self._calibration, self._outputMap,
+                             self._inverted, self._smooth, self._filterConfig, self._inputMap)
+        if profile is None:
+            return base
+        return PedalPipeline.from_config(profile, self._raw_bit, self._hid_bit, base)
+
+    def use_pipeline(self, pipeline):
+        """
+        Switch processing to a precompiled pipeline. The new filter is primed with the
+        last filtered value so the output does not jump.
+        """
+        previous = getattr(self, "_pipeline", None)
+        if previous is not None and pipeline is not previous:
+            pipeline.filter.prime(self._filteredValue)
+        self._pipeline = pipeline
+
+    def rebuild_curve(self):
+        """
+        Recompile the pedal's own pipeline after bits, calibration, output map or filter changed.
+        """
+        self.use_pipeline(self.compile_pipeline())
+
+    def configure(self, config, sections):
+        """
+        Apply the changed sections of a pedal configuration without touching the rest.
+        :param config: The pedal's settings dictionary (as stored in settings.json).
+        :param sections: The section names that changed (e.g., "input", "bits", "smooth").
+        """
+        if "input" in sections:
+            self.release_input()
+            input_config = config.get("input") or {}
+            input_type = input_config.get("type")
+            if input_type == "Analog":
+                self.config_analog(input_config["pin"], input_config.get("burst"))
+            elif input_type == "Loadcell":
+                pins = input_config["pins"]
+                self.config_load_cell(pins["DOUT"], pins["CLK"], driver=input_config.get("driver", "gpio"),
+                                      rate=input_config.get("rate", 80), tare=config.get("tare"))
+            elif input_type == "ADS":
+                self.config_ads(input_config.get("channel", "auto"), input_config.get("address", 0x48))
+            boot_trace.mark(f"pedal.{self._name}.input")
+
+        if "bits" in sections:
+            bits = config.get("bits", {})
+            self.set_bits(get_bit_depth(bits.get("raw", "16bit")), get_bit_depth(bits.get("hid", "16bit")))
+
+        if "smooth" in sections:
+            self._smooth = bool(config.get("smooth", False))
+
+        if "filter" in sections:
+            self._filterConfig = config.get("filter")
+
+        if "oversample" in sections:
+            self.set_oversample(config.get("oversample"))
+
+        if "inverted" in sections:
+            self._inverted = bool(config.get("inverted", False))
+
+        if "calibration" in sections and config.get("calibration"):
+            self._calibration = [int(v) for v in config["calibration"][:4]]
+
+        if "output_map" in sections and config.get("output_map"):
+            self._outputMap = [int(v) for v in config["output_map"][:6]]
+
+        if [section for section in sections if section not in ("input", "on", "oversample")]:
+            self.rebuild_curve()
+
+    def set_oversample(self, oversample_config):
+        """
+        Configure the oversample-and-decimate stage.
+        :param oversample_config: {"samples": N, "mode": "average" or "cic", "stages": CIC stages},
+                                  or None to read single samples.
+        """
+        if oversample_config and oversample_config.get("samples", 1) > 1:
+            self._oversampler = Oversampler(int(oversample_config["samples"]),
+                                            oversample_config.get("mode", "average"),
+                                            int(oversample_config.get("stages", 3)))
+        else:
+            self._oversampler = None
+
+    def get_effective_bits(self):
+        """
+        Resolution of the value entering the filter chain, including the gain from oversampling.
+        Samples are decimated at the input's resolution, so that is what oversampling adds to.
+        """
+        bits = self.backend.bits if self.backend is not None else self._raw_bit.bit_length()
+        if self._oversampler:
+            return self._oversampler.effective_bits(bits)
+        return bits
 
     # Accessors for HID and string output
     def get_after_hid(self):
         return self._afterHID
 
     def get_pedal_string(self):
-        return self._pedalString
+        """
+        Build the text status string (prefix, before/after curve in percent, raw, before HID) on demand.
+        """
+        pipeline = self._pipeline
+        beforeSerial = utilLib.scale_map(self._pedalOutput, pipeline.low_deadzone, pipeline.top_deadzone,
+                                         0, self._serial_range)
+        afterSerial = utilLib.scale_multi_map(beforeSerial, pipeline.input_map, pipeline.output_map)
+        return f"{self._prefix}{beforeSerial};{afterSerial};{int(self._rawValue)};{self._beforeHID},"
+
+    def get_telemetry_value(self, field):
+        """
+        Return one telemetry field: "raw", "filtered", "before", "after" or "timing" (read time in us).
+        """
+        if field == "raw":
+            return int(self._rawValue)
+        if field == "filtered":
+            return int(self._filteredValue)
+        if field == "before":
+            return self._beforeHID
+        if field == "after":
+            return self._afterHID
+        if field == "timing":
+            return self._readTime // 1000
+        raise ValueError(f"unknown field {field}")
 
     # Pedal processing
+    def input_ready(self):
+        """
+        Check whether a sample can be read without waiting.
+        """
+        return self.backend is None or self.backend.ready()
+
     def read_values(self):
         """
         Read raw values from the configured input source.
         """
-        rawValue = 0
-
-        if self._signal == 0 and self._analogInput:
-            rawValue = self._analogInput.read()
-        elif self._signal == 1 and self._loadCell:
-            rawValue = max(min(self._loadCell.get_value(1), 16777215), 0)
-        elif self._signal == 2 and self._channel is not None:
-            rawValue = max(self._ads1015.read(self._channel), 0)
+        start = time.monotonic_ns()
+        buffer = self._buffer
+        count = self._read_into(buffer)
+        if not count:
+            return  # No sample: the input failed and the pedal holds its last value
+
+        oversampler = self._oversampler
+        if count == 1:
+            rawValue = oversampler.add(buffer[0]) if oversampler else buffer[0]
         else:
-            raise ValueError("Invalid signal configuration or missing input.")
+            # The whole block goes through the decimation stage at once
+            rawValue = oversampler.add_block(buffer) if oversampler else sum(buffer) / count
+        if rawValue is None:
+            return  # Still collecting samples for the next output
+        # Samples are decimated at the backend's resolution and only the result is scaled
+        rawValue = self.backend.scale(rawValue)
 
         self.update_pedal(rawValue)
+        if self._mailbox is not None:
+            self._mailbox.publish(self._slot, self._afterHID, start)
+        if self.timed:
+            self._readTime = time.monotonic_ns() - start
 
     def update_pedal(self, rawValue):
         """
         Process the raw value, apply smoothing, inversion, mapping, and update HID outputs.
         """
-        if self._smooth:
-            filter_map = {"B:": _brakeFilter, "T:": _throttleFilter, "C:": _clutchFilter}
-            filter_instance = filter_map.get(self._prefix)
-            if filter_instance:
-                rawValue = filter_instance.process(rawValue)
+        pipeline = self._pipeline
+        self._rawValue = rawValue
+        if pipeline.smooth:
+            rawValue = pipeline.filter.process(rawValue)
+        self._filteredValue = rawValue
 
-        if self._inverted:
-            rawValue = self._raw_bit - rawValue
+        if pipeline.inverted:
+            rawValue = pipeline.raw_bit - rawValue
 
-        lowDeadzone = max(self._calibration[0], self._calibration[2])
-        topDeadzone = min(self._calibration[1], self._calibration[3])
+        lowDeadzone = pipeline.low_deadzone
+        topDeadzone = pipeline.top_deadzone
         pedalOutput = max(min(rawValue, topDeadzone), lowDeadzone)
 
         # HID mapping
-        inputMapHID = UtilLib.array_map_multiplier(self._inputMap[:], (self._hid_bit / 100))
-        outputMapHID = UtilLib.array_map_multiplier(self._outputMap[:], (self._hid_bit / 100))
-
-        beforeHID = UtilLib.scale_map(pedalOutput, lowDeadzone, topDeadzone, 0, self._hid_bit)
-        afterHID = UtilLib.scale_multi_map(beforeHID, inputMapHID, outputMapHID)
+        beforeHID = utilLib.scale_map(pedalOutput, lowDeadzone, topDeadzone, 0, pipeline.hid_bit)
+        afterHID = utilLib.scale_multi_map(beforeHID, pipeline.input_map_hid, pipeline.output_map_hid)
 
-        # Serial mapping
-        beforeSerial = UtilLib.scale_map(pedalOutput, lowDeadzone, topDeadzone, 0, self._serial_range)
-        afterSerial = UtilLib.scale_multi_map(beforeSerial, self._inputMap, self._outputMap)
-
-        self._pedalString = f"{self._prefix}{beforeSerial};{afterSerial};{rawValue};{beforeHID},"
+        # Serial/telemetry output is built from these on demand
+        self._pedalOutput = pedalOutput
+        self._beforeHID = beforeHID
         self._afterHID = afterHID
 
-        # Update gamepad HID
-        self._gamepad.move_joystick(x=afterHID, y=0)
-
     # Calibration and Configuration Methods
 
     def get_storage(self):
@@ -132,51 +359,55 @@ class Pedal:
         storagehelper = self.get_storage()
         stored_map = storagehelper.read_from_settings(f"{self._prefix}_output_map")
         if stored_map:
-            self._outputMap = [int(UtilLib.get_value(stored_map, '-', i)) for i in range(6)]
+            self._outputMap = [int(utilLib.get_value(stored_map, '-', i)) for i in range(6)]
         else:
             self._outputMap = [0, 20, 40, 60, 80, 100]
 
     def set_smooth_values(self, smoothValues):
         self._smooth = bool(smoothValues)
-        self.storagehelper.write_to_settings(f"{self._prefix}_smooth", self._smooth)
+        self.rebuild_curve()
+        self.storagehelper.write_to_settings(f"{self._name}.smooth", self._smooth)
 
     def get_smooth_values(self):
-        self._smooth = self.storagehelper.read_from_settings(f"{self._prefix}_smooth") or False
-        return self._smooth
+        return self._pipeline.smooth
 
     def set_inverted_values(self, invertedValues):
         self._inverted = bool(invertedValues)
-        self.storagehelper.write_to_settings(f"{self._prefix}_inverted", self._inverted)
+        self.rebuild_curve()
+        self.storagehelper.write_to_settings(f"{self._name}.inverted", self._inverted)
 
     def get_inverted_values(self):
-        self._inverted = self.storagehelper.read_from_settings(f"{self._prefix}_inverted") or False
-        return self._inverted
+        return self._pipeline.inverted
 
-    def reset_calibration_values(self, EEPROMSpace):
+    def reset_calibration_values(self, EEPROMSpace=None):
         resetMap = [0, self._raw_bit, 0, self._raw_bit]
         self._calibration = resetMap
-        self.storagehelper.write_to_settings(EEPROMSpace, UtilLib.generate_string_map_cali(resetMap))
+        self.storagehelper.write_record(EEPROMSpace or f"{self._name}.calibration", resetMap)
+        self.rebuild_curve()
 
     def get_eeprom_calibration_values(self, EEPROMSpace):
         EEPROM_Map = self.storagehelper.read_from_settings(EEPROMSpace)
         if EEPROM_Map:
             self.set_calibration_values(EEPROM_Map, EEPROMSpace)
 
-    def set_calibration_values(self, map, EEPROMSpace):
-        self._calibration = [int(UtilLib.get_value(map, '-', i)) for i in range(4)]
-        self.storagehelper.write_to_settings(EEPROMSpace, map)
+    def set_calibration_values(self, map, EEPROMSpace=None):
+        self._calibration = [int(utilLib.get_value(map, '-', i)) for i in range(4)]
+        self.storagehelper.write_record(EEPROMSpace or f"{self._name}.calibration", self._calibration)
+        self.rebuild_curve()
 
     def get_calibration_values(self, prefix):
-        return prefix + UtilLib.generate_string_map_cali(self._calibration)
+        return prefix + utilLib.generate_string_map_cali(self._pipeline.calibration)
 
-    def reset_output_map_values(self, EEPROMSpace):
+    def reset_output_map_values(self, EEPROMSpace=None):
         resetMap = [0, 20, 40, 60, 80, 100]
         self._outputMap = resetMap
-        self.storagehelper.write_to_settings(EEPROMSpace, UtilLib.generate_string_map(resetMap))
+        self.storagehelper.write_record(EEPROMSpace or f"{self._name}.output_map", resetMap)
+        self.rebuild_curve()
 
-    def set_output_map_values(self, map, EEPROMSpace):
-        self._outputMap = [int(UtilLib.get_value(map, '-', i)) for i in range(6)]
-        self.storagehelper.write_to_settings(EEPROMSpace, map)
+    def set_output_map_values(self, map, EEPROMSpace=None):
+        self._outputMap = [int(utilLib.get_value(map, '-', i)) for i in range(6)]
+        self.storagehelper.write_record(EEPROMSpace or f"{self._name}.output_map", self._outputMap)
+        self.rebuild_curve()
 
     def get_output_map_values(self, prefix, EEPROMSpace):
-        return prefix + UtilLib.generate_string_map(self._outputMap)
+        return prefix + utilLib.generate_string_map(self._pipeline.output_map)
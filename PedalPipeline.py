@@ -0,0 +1,64 @@
+from UtilLibrary import UtilLib
+from Filters import Biquad, BiquadType
+
+utilLib = UtilLib()
+
+DEFAULT_INPUT_MAP = [0, 20, 40, 60, 80, 100]
+DEFAULT_FILTER = {"fc": 0.2, "q": 0.5}
+
+
+class PedalPipeline:
+    """
+    Ready-to-run processing stage for one pedal: filter, inversion, deadzones and transfer curve.
+    Everything that can be derived from the configuration is computed once here, so switching
+    between pipelines is a single reference swap.
+    """
+
+    def __init__(self, raw_bit, hid_bit, calibration, output_map, inverted=False, smooth=False,
+                 filter_config=None, input_map=DEFAULT_INPUT_MAP):
+        self.raw_bit = raw_bit
+        self.hid_bit = hid_bit
+        self.calibration = list(calibration[:4])
+        self.output_map = list(output_map[:6])
+        self.input_map = list(input_map)
+        self.inverted = bool(inverted)
+        self.smooth = bool(smooth)
+        self.filter_config = filter_config or DEFAULT_FILTER
+
+        self.filter = Biquad(BiquadType.LOWPASS, self.filter_config.get("fc", 0.2),
+                             self.filter_config.get("q", 0.5), 0.0)
+        self.low_deadzone = max(self.calibration[0], self.calibration[2])
+        self.top_deadzone = min(self.calibration[1], self.calibration[3])
+        self.input_map_hid = utilLib.array_map_multiplier(self.input_map, hid_bit / 100)
+        self.output_map_hid = utilLib.array_map_multiplier(self.output_map, hid_bit / 100)
+
+    @classmethod
+    def from_config(cls, config, raw_bit, hid_bit, base=None):
+        """
+        Compile a pipeline from a pedal or profile configuration dictionary.
+        :param config: Dictionary with any of "calibration", "output_map", "inverted", "smooth", "filter".
+        :param raw_bit: The raw full-scale value of the pedal's input.
+        :param hid_bit: The HID full-scale value of the pedal's output.
+        :param base: Optional pipeline providing values for keys missing from config.
+        """
+        return cls(
+            raw_bit,
+            hid_bit,
+            [int(v) for v in config.get("calibration") or (base.calibration if base else [0, raw_bit, 0, raw_bit])],
+            [int(v) for v in config.get("output_map") or (base.output_map if base else DEFAULT_INPUT_MAP)],
+            config.get("inverted", base.inverted if base else False),
+            config.get("smooth", base.smooth if base else False),
+            config.get("filter") or (base.filter_config if base else None),
+        )
+
+    def to_config(self):
+        """
+        Return the configuration dictionary this pipeline was compiled from.
+        """
+        return {
+            "calibration": self.calibration,
+            "output_map": self.output_map,
+            "inverted": self.inverted,
+            "smooth": self.smooth,
+            "filter": self.filter_config,
+        }
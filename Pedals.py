@@ -1,361 +1,904 @@
-import time
-from UtilLibrary import UtilLib
-import microcontroller
+import json
 from Pedal import Pedal
-from adafruit_ads1x15.ads1115 import ADS1115
+from Filters import OVERSAMPLE_MODES
+from boot_trace import boot_trace
 from simple import Gamepad
-from bit_utils import get_bit_depth
+from bit_utils import BIT_DEPTH_MAP, get_bit_depth
+from serial_commands import CommandDispatcher, CommandError
+from serial_reader import SerialLineReader
+from telemetry import Telemetry
+from mailbox import Mailbox
+from pedal_registry import pedal_list
+from rate_tuning import DEFAULT_TARGET_RATE, DEFAULT_ADS_GAIN, plan_ads, validate_gain, input_rate
 import usb_cdc
 from gpio_utils import check_pinout
 import usb_hid
 
-utilLib = UtilLib()
-
 # Constants
 E_INIT = "init_flag"
-E_PEDAL_INVERTED_MAP = "pedal_inverted_map"
-E_PEDAL_SMOOTH_MAP = "pedal_smooth_map"
+
+# Per-pedal settings sections that can be applied independently
+PEDAL_SECTIONS = ("on", "input", "bits", "smooth", "filter", "oversample", "inverted", "calibration", "output_map")
+# Input types a pedal can be configured with
+INPUT_TYPES = ("Analog", "Loadcell", "ADS")
+# Per-pedal settings that a named profile may override
+PROFILE_KEYS = ("calibration", "output_map", "inverted", "smooth", "filter")
+# The HID report descriptor has 16-bit axes
+HID_MAX = BIT_DEPTH_MAP["16bit"]
 
 
 class Pedals:
-    def __init__(self, i2c):
+    def __init__(self, i2c, storagehelper, i2c_health=None):
         self.i2c = i2c
-        self.gamepad = Gamepad(usb_hid.devices)
-
-        # Create the pedals
-        self._throttle = Pedal("T:", self.i2c, self.gamepad)
-        self._brake = Pedal("B:", self.i2c, self.gamepad)
-        self._clutch = Pedal("C:", self.i2c, self.gamepad)
-
-        self._pedals = {
-            "throttle": {"pedal": self._throttle, "prefix": "T"},
-            "brake": {"pedal": self._brake, "prefix": "B"},
-            "clutch": {"pedal": self._clutch, "prefix": "C"},
+        # Recovers the I2C bus when an ADS1x15 keeps failing (i2c_health.I2CHealth)
+        self.i2c_health = i2c_health
+        # Pedals whose last read failed, so each failure is only printed once
+        self._failing = set()
+        self.storagehelper = storagehelper
+        # The pedals and their HID axes come from the "pedals" list in settings; boot.py built the
+        # report descriptor from the same list, so a changed list takes effect after a reset
+        registry = pedal_list(storagehelper.read_from_settings())
+
+        # Don't wait for USB: sampling, filtering and tare start right away and
+        # HID reporting attaches once the host has enumerated the device
+        self.gamepad = Gamepad(usb_hid.devices, wait=False, axes=len(registry))
+        boot_trace.mark("pedals.gamepad")
+
+        # Create the pedals, in HID axis order
+        self._pedals = {}
+        for name, prefix, axis in registry:
+            pedal = Pedal(f"{prefix}:", self.i2c, self.gamepad, name, storagehelper)
+            self._pedals[name] = {"pedal": pedal, "prefix": prefix, "axis": axis}
+        self._on_states = {name: False for name in self._pedals}
+        # (name, pedal) of the enabled pedals, the list the loop iterates
+        self._active = []
+
+        # Samplers publish their latest HID value here; the reporter sends whatever is freshest
+        self.mailbox = Mailbox(list(self._pedals.keys()))
+        for name, entry in self._pedals.items():
+            entry["pedal"].attach_mailbox(self.mailbox, self.mailbox.slots[name])
+        self._reported_version = -1
+
+        # Snapshot of the per-pedal configuration currently applied to the hardware
+        self._applied = {}
+        # Pedal name -> (input samples per second, outputs per second after oversampling)
+        self._rates = {}
+
+        # Precompiled profiles: profile name -> {pedal name: PedalPipeline}
+        self._profiles = {}
+        self._active_profile = None
+        self._profile_button = None
+        self._profile_button_released = True
+
+        # Query responses pre-encoded from the current configuration, rebuilt after it changes
+        self._response_builders = {
+            "GetUsage": self.get_usage,
+            "GetMap": self.get_map,
+            "GetInverted": self.get_inverted,
+            "GetSmooth": self.get_smooth,
+            "GetCali": self.get_calibration,
+            "GetBits": self.get_bits,
+            "GetOversample": self.get_oversample,
+            "GetRates": self.get_rates,
+            "GETALL": self.get_all,
         }
-        self._on_states = {"throttle": False, "brake": False, "clutch": False}
+        self._responses = None
+
+        # Commands are read from the data port when boot.py enabled it, and answered on the same port
+        self.serial = usb_cdc.data or usb_cdc.console
+        self.commands = CommandDispatcher(self.serial.write)
+        self.register_commands()
+        self.serial_reader = SerialLineReader(self.serial, self.process_serial_command,
+                                              on_overflow=self.handle_overflow)
+        self.telemetry = Telemetry(self.serial)
 
     def setup(self):
         """
-        Initialize the pedals, load settings, and configure ADS1115.
+        Initialize the pedals, load settings and profiles, and configure the serial reader.
         """
         print("Setting up pedals...")
         self.load_settings()
-
-        # Configure the ADS1115
-        _ads1015 = ADS1115(self.i2c)
-        _ads1015.gain = 0  # 6.144 volts
-        _ads1015.mode = 0  # Continuous mode
-        _ads1015.data_rate = 7  # Fast data rate
+        boot_trace.mark("pedals.settings")
+        self.load_profiles()
+        self.setup_profile_button()
+        boot_trace.mark("pedals.profiles")
+
+        serial_config = self.storagehelper.read_from_settings("serial") or {}
+        self.serial_reader.budget_ns = int(serial_config.get("budget_ms", 2) * 1_000_000)
+
+    def tune_rates(self):
+        """
+        Pick the data rate, conversion mode and channel sequence of every ADS1115 from the enabled
+        pedals and the target rate ("target_rate" in settings, samples/s per pedal), then work out
+        the sample rate each pedal gets. The gain comes from "ads": {"gain": ...} (default 2/3).
+        """
+        settings = self.storagehelper.read_from_settings()
+        target_rate = settings.get("target_rate", DEFAULT_TARGET_RATE)
+
+        # Group the enabled ADS pedals by the device they are wired to
+        sequences = {}
+        for name, entry in self._pedals.items():
+            backend = entry["pedal"].backend
+            if self._on_states[name] and backend is not None and backend.input_type == "ADS":
+                sequences.setdefault(backend.device, []).append(backend.channel)
+
+        for device, channels in sequences.items():
+            data_rate, mode, _ = plan_ads(device.ads.rates, len(channels), target_rate)
+            gain = validate_gain(device.ads.gains, (settings.get("ads") or {}).get("gain", DEFAULT_ADS_GAIN))
+            device.configure(channels, data_rate, mode, gain)
+            print(f"ADS: channels {channels} at {data_rate} SPS, {'continuous' if len(channels) == 1 else 'single-shot'}")
+
+        rates = {}
+        for name, entry in self._pedals.items():
+            pedal = entry["pedal"]
+            if not self._on_states[name]:
+                rates[name] = (0, 0)
+                continue
+            input_config = (self._applied.get(name) or {}).get("input") or {}
+            sample_rate = input_rate(input_config, target_rate, pedal.backend.nominal_rate if pedal.backend else None)
+            samples = pedal._oversampler.samples if pedal._oversampler else 1
+            rates[name] = (sample_rate, sample_rate / samples)
+        self._rates = rates
+        print(f"Pedal sample rates: {rates}")
 
     def loop(self):
         try:
-            rx, ry, rz = 0, 0, 0
-            serial_string = ""
-
-            # Process throttle pedal
-            if self._on_states["throttle"]:
-                self._throttle.read_values()
-                new_rx = self._throttle.get_after_hid()
-                if new_rx != rx:  # Only update if value has changed
-                    rx = new_rx
-                serial_string += self._throttle.get_pedal_string()
-
-            # Process brake pedal
-            if self._on_states["brake"]:
-                self._brake.read_values()
-                new_ry = self._brake.get_after_hid()
-                if new_ry != ry:  # Only update if value has changed
-                    ry = new_ry
-                serial_string += self._brake.get_pedal_string()
-
-            # Process clutch pedal
-            if self._on_states["clutch"]:
-                self._clutch.read_values()
-                new_rz = self._clutch.get_after_hid()
-                if new_rz != rz:  # Only update if value has changed
-                    rz = new_rz
-                serial_string += self._clutch.get_pedal_string()
-
-            # Send HID report if any value has changed
-            self.gamepad.set_axes(rx=rx, ry=ry, rz=rz)
-
-            # Send serial output if available
-            if usb_cdc.console.out_waiting == 0:
-                usb_cdc.console.write(serial_string.encode("utf-8") + b"\n")
+            if self._profile_button:
+                self.poll_profile_button()
+
+            # Process the pedals; a failing input only affects its own pedal
+            for name, pedal in self._active:
+                self.sample(name, pedal)
+            if self.i2c_health:
+                self.i2c_health.poll()
+
+            self.report()
+
+            # Telemetry only costs anything while a host is subscribed
+            if self.telemetry.active:
+                self.telemetry.tick()
         except Exception as e:
             print(f"Unhandled exception in loop: {e}")
 
+        # Execute incoming commands within the configured time budget, even if sampling failed
+        self.serial_reader.poll()
 
+    def sample(self, name, pedal):
+        """
+        Read one pedal. When the read fails the pedal keeps its last reported value.
+        """
+        try:
+            pedal.read_values()
+        except Exception as e:
+            if name not in self._failing:
+                self._failing.add(name)
+                print(f"Reading {name} failed, holding its last value: {e}")
+            return
+        if self._failing:
+            self._failing.discard(name)
+
+    def report(self):
+        """
+        Send one HID report from the freshest value of every pedal; disabled pedals hold 0.
+        Nothing is sent if no pedal has published since the last report.
+        """
+        mailbox = self.mailbox
+        if mailbox.version == self._reported_version:
+            return
+        self._reported_version = mailbox.version
+        # A value outside the 16-bit axis range would make the gamepad reject the whole report
+        self.gamepad.set_axes(*[max(min(value, HID_MAX), 0) for value in mailbox.values])
+
+    def update_active(self):
+        """
+        Rebuild the list of enabled pedals after an on/off change and zero the axes of disabled ones.
+        """
+        self._active = [(name, entry["pedal"]) for name, entry in self._pedals.items() if self._on_states[name]]
+        for name, slot in self.mailbox.slots.items():
+            if not self._on_states[name]:
+                self.mailbox.publish(slot, 0)
 
     ### Serial Command Processing ###
+    def register_commands(self):
+        """
+        Register every serial command with the dispatcher. Each Get has a Set counterpart.
+        """
+        commands = self.commands
+        for verb in self._response_builders:
+            commands.register(verb, lambda args, verb=verb: self.cached_response(verb))
+        commands.register("SetUsage", self.set_usage, 2)
+        commands.register("SetMap", self.set_map, 2)
+        commands.register("SetInverted", self.set_inverted, 1)
+        commands.register("INVER", self.set_inverted, 1)
+        commands.register("SetSmooth", self.set_smooth, 1)
+        commands.register("SMOOTH", self.set_smooth, 1)
+        commands.register("SetCali", self.set_calibration, 2)
+        commands.register("SetBits", self.set_bits, 3)
+        commands.register("TARE", self.handle_tare, 1)
+        commands.register("SETALL", self.set_all, 1, raw=True)
+        commands.register("STREAM", self.handle_stream, 1, 3)
+        commands.register("GetStream", self.get_stream)
+        commands.register("GetProfiles", self.get_profiles)
+        commands.register("PROFILE", self.handle_profile_command, 1, 2)
+        commands.register("GetBootTrace", self.get_boot_trace)
+        commands.register("GetImports", self.get_imports)
+        commands.register("GetI2C", self.get_i2c)
+        commands.register("RELOAD", self.handle_reload)
+        commands.register("RESET", self.handle_reset)
+        commands.register("clearEEPROM", self.clear_eeprom)
+
     def process_serial_command(self, msg):
         """
-        Process incoming serial commands.
+        Process one incoming serial command line.
         """
-        if "clearEEPROM" in msg:
-            self.clear_eeprom()
-            usb_cdc.console.write(b"done\n")
-        if "RESET" in msg:
-            self.reset_device_settings()
+        result = self.commands.dispatch(msg)
+        # Re-encode right after a command changed the configuration, so the next query is served from RAM
+        if self._responses is None:
+            self.refresh_responses()
+        return result
+
+    def handle_overflow(self, verb):
+        """
+        Answer a command line that was too long for the serial buffer.
+        """
+        self.commands.respond(f"ERR:{verb or 'line'}:line too long")
+
+    def refresh_responses(self):
+        """
+        Encode every cached query response from the current configuration.
+        """
+        responses = {}
+        for verb, builder in self._response_builders.items():
+            responses[verb] = f"{builder(None)}\n".encode("utf-8")
+        self._responses = responses
+
+    def invalidate_responses(self):
+        """
+        Mark the cached query responses stale after a configuration change.
+        """
+        self._responses = None
 
-        # Handle specific commands
-        print(f"Processing message: {msg}")
-        self.handle_command(msg, "GetUsage", self.get_usage)
-        self.handle_command(msg, "GetMap", self.get_map)
-        self.handle_command(msg, "GetInverted", self.get_inverted)
-        self.handle_command(msg, "GetSmooth", self.get_smooth)
-        self.handle_command(msg, "GetCali", self.get_calibration)
-        self.handle_command(msg, "GetBits", self.get_bits)
+    def cached_response(self, verb):
+        """
+        Return the pre-encoded response for a query, encoding them first if they are stale.
+        """
+        if self._responses is None:
+            self.refresh_responses()
+        return self._responses[verb]
 
     # Helper methods for serial commands
-    def handle_command(self, msg, command, handler):
+    def resolve_pedal(self, key):
         """
-        Helper method to process serial commands.
+        Look up a pedal by name ("throttle") or prefix ("T").
+        :raises CommandError: If no pedal matches.
         """
-        if command in msg:
-            handler(msg)
+        if key in self._pedals:
+            return key
+        for name, entry in self._pedals.items():
+            if entry["prefix"] == key.upper():
+                return name
+        raise CommandError(f"unknown pedal {key}")
 
-    def clear_eeprom(self):
+    @staticmethod
+    def parse_values(text, count, low=None, high=None):
+        """
+        Parse a hyphen-separated list of integers such as "0-20-40-60-80-100".
+        :raises CommandError: If the count or range is wrong.
+        """
+        try:
+            values = [int(value) for value in text.split("-")]
+        except ValueError:
+            raise CommandError(f"invalid values {text}")
+        if len(values) != count:
+            raise CommandError(f"expected {count} values")
+        for value in values:
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise CommandError(f"value {value} out of range")
+        return values
+
+    def clear_eeprom(self, args):
         """Clear all settings from storage."""
-        utilLib.clear_storage()
+        self.storagehelper.reset_to_defaults()
+        self.storagehelper.reload()
+        self.apply_settings(self.storagehelper.read_from_settings())
+        self.invalidate_responses()
+        return "done"
+
+    def handle_reload(self, args):
+        self.reload_settings()
+        return "done"
+
+    def handle_reset(self, args):
+        self.reset_device_settings()
+        return "done"
 
-    def get_usage(self, msg):
+    def get_usage(self, args):
         """
-        Send the usage status of all pedals via serial.
+        Report the usage status of all pedals in the format USAGE:throttle:True,brake:False,...
         """
-        if "GetUsage" in msg:
-            usage = ",".join([f"{name}:{self.get_pedal_on(name)}" for name in self._pedals.keys()])
-            usb_cdc.console.write(f"USAGE:{usage}\n".encode("utf-8"))
+        usage = ",".join([f"{name}:{self.get_pedal_on(name)}" for name in self._pedals.keys()])
+        return f"USAGE:{usage}"
 
+    def set_usage(self, args):
+        """
+        Enable or disable a pedal: SetUsage:<pedal>:<0|1>.
+        """
+        name = self.resolve_pedal(args[0])
+        self.set_pedal_on(name, bool(self.parse_values(args[1], 1, 0, 1)[0]))
+        return "done"
 
-    def get_map(self, msg):
+    def get_map(self, args):
         """
-        Send the output map of all pedals via serial using their prefixes.
+        Report the output map of all pedals using their prefixes: MAP:TMAP:0-20-40-60-80-100,BMAP:...
         """
-        if "GetMap" in msg:
-            print("Processing GetMap command")  # Debug line
-            try:
-                map_entries = []
-                for name, pedal in self._pedals.items():
-                    prefix = pedal["prefix"]
-                    output_map = pedal["pedal"].get_output_map_values("", f"{name}_output_map")
-                    map_entry = f"{prefix}MAP:{','.join(map(str, output_map))}"
-                    map_entries.append(map_entry)
-
-                map_values = ",".join(map_entries)
-                print(f"Generated map values: {map_values}")  # Debug line
-                usb_cdc.console.write(f"MAP:{map_values}\n".encode("utf-8"))
-            except Exception as e:
-                print(f"Error in get_map: {e}")  # Debug line
+        map_entries = []
+        for name, pedal in self._pedals.items():
+            output_map = pedal["pedal"].get_output_map_values("", f"{name}_output_map")
+            map_entries.append(f"{pedal['prefix']}MAP:{output_map}")
+        return f"MAP:{','.join(map_entries)}"
 
+    def set_map(self, args):
+        """
+        Set a pedal's output map: SetMap:<pedal>:<6 values 0-100>.
+        """
+        name = self.resolve_pedal(args[0])
+        self.parse_values(args[1], 6, 0, 100)
+        pedal = self._pedals[name]["pedal"]
+        pedal.set_output_map_values(args[1])
+        self.mark_applied(name, "output_map", list(pedal._outputMap))
+        self.refresh_profiles()
+        self.invalidate_responses()
+        return "done"
 
+    def get_inverted(self, args):
+        """
+        Report the inversion status of all pedals in the format INVER:1-1-1.
+        """
+        inverted_values = [str(int(pedal["pedal"].get_inverted_values())) for pedal in self._pedals.values()]
+        return f"INVER:{'-'.join(inverted_values)}"
 
+    def set_inverted(self, args):
+        """
+        Update the inversion settings of all pedals: SetInverted:0-1-0 (or the legacy INVER:0-1-0).
+        """
+        values = self.parse_values(args[0], len(self._pedals), 0, 1)
+        for name, inverted in zip(self._pedals, values):
+            self._pedals[name]["pedal"].set_inverted_values(inverted)
+            self.mark_applied(name, "inverted", bool(inverted))
+        self.refresh_profiles()
+        self.invalidate_responses()
+        return "done"
 
-    def get_inverted(self, msg):
+    def get_smooth(self, args):
         """
-        Send the inversion status of all pedals via serial in the format INVER:1-1-1.
+        Report the smoothing status of all pedals in the format SMOOTH:1-1-1.
         """
-        if "GetInverted" in msg:
-            print("Processing GetInverted command")  # Debug line
-            try:
-                inverted_values = []
-                for pedal in self._pedals.values():
-                    inverted_values.append(str(int(pedal["pedal"].get_inverted_values())))
-                
-                result = "-".join(inverted_values)
-                print(f"Inverted values: {result}")  # Debug line
-                usb_cdc.console.write(f"INVER:{result}\n".encode("utf-8"))
-            except Exception as e:
-                print(f"Error in get_inverted: {e}")  # Debug line
+        smooth_values = [str(int(pedal["pedal"].get_smooth_values())) for pedal in self._pedals.values()]
+        return f"SMOOTH:{'-'.join(smooth_values)}"
 
+    def set_smooth(self, args):
+        """
+        Update the smoothing settings of all pedals: SetSmooth:1-1-1 (or the legacy SMOOTH:1-1-1).
+        """
+        values = self.parse_values(args[0], len(self._pedals), 0, 1)
+        for name, smooth in zip(self._pedals, values):
+            self._pedals[name]["pedal"].set_smooth_values(smooth)
+            self.mark_applied(name, "smooth", bool(smooth))
+        self.refresh_profiles()
+        self.invalidate_responses()
+        return "done"
 
-    def get_smooth(self, msg):
+    def get_calibration(self, args):
         """
-        Send the smoothing status of all pedals via serial in the format SMOOTH:1-1-1.
+        Report the calibration values of all pedals using their prefixes: CALI:TCALI:0-1023-0-1023,BCALI:...
         """
-        if "GetSmooth" in msg:
-            print("Processing GetSmooth command")  # Debug line
-            try:
-                smooth_values = []
-                for pedal in self._pedals.values():
-                    smooth_values.append(str(int(pedal["pedal"].get_smooth_values())))
-                
-                result = "-".join(smooth_values)
-                print(f"Smoothing values: {result}")  # Debug line
-                usb_cdc.console.write(f"SMOOTH:{result}\n".encode("utf-8"))
-            except Exception as e:
-                print(f"Error in get_smooth: {e}")  # Debug line
+        calibration_entries = []
+        for pedal in self._pedals.values():
+            calibration_values = pedal["pedal"].get_calibration_values("")
+            calibration_entries.append(f"{pedal['prefix']}CALI:{calibration_values}")
+        return f"CALI:{','.join(calibration_entries)}"
 
+    def set_calibration(self, args):
+        """
+        Set a pedal's calibration: SetCali:<pedal>:<low-high-low-high>.
+        """
+        name = self.resolve_pedal(args[0])
+        self.parse_values(args[1], 4, 0)
+        pedal = self._pedals[name]["pedal"]
+        pedal.set_calibration_values(args[1])
+        self.mark_applied(name, "calibration", list(pedal._calibration))
+        self.refresh_profiles()
+        self.invalidate_responses()
+        return "done"
 
+    def get_bits(self, args):
+        """
+        Report the bit depths (raw and HID) of all pedals in the format BITS:raw-hid-raw-hid-raw-hid.
+        """
+        bits_values = [f"{pedal['pedal']._raw_bit}-{pedal['pedal']._hid_bit}" for pedal in self._pedals.values()]
+        return f"BITS:{'-'.join(bits_values)}"
 
-    def get_calibration(self, msg):
+    def set_bits(self, args):
         """
-        Send the calibration values of all pedals via serial using their prefixes.
+        Set a pedal's bit depths: SetBits:<pedal>:<raw label>:<hid label>, e.g. SetBits:T:10bit:15bit.
+        The HID depth is at most 16bit, the size of the report's axes.
         """
-        if "GetCali" in msg:
-            print("Processing GetCali command")  # Debug line
-            try:
-                calibration_entries = []
-                for name, pedal in self._pedals.items():
-                    prefix = pedal["prefix"]
-                    calibration_values = pedal["pedal"].get_calibration_values(f"{prefix}CALI:")
-                    calibration_entry = f"{prefix}CALI:{','.join(map(str, calibration_values))}"
-                    calibration_entries.append(calibration_entry)
-
-                result = ",".join(calibration_entries)
-                print(f"Calibration values: {result}")  # Debug line
-                usb_cdc.console.write(f"CALI:{result}\n".encode("utf-8"))
-            except Exception as e:
-                print(f"Error in get_calibration: {e}")  # Debug line
+        name = self.resolve_pedal(args[0])
+        for label in args[1:]:
+            if label not in BIT_DEPTH_MAP:
+                raise CommandError(f"unknown bit depth {label}")
+        if BIT_DEPTH_MAP[args[2]] > HID_MAX:
+            raise CommandError(f"HID bit depth {args[2]} exceeds 16bit")
+        self.set_pedal_bits(name, args[1], args[2])
+        return "done"
 
+    def handle_tare(self, args):
+        """
+        Zero a load cell pedal and store the offset, which is used from then on instead of taring
+        at every boot: TARE:<pedal>.
+        """
+        name = self.resolve_pedal(args[0])
+        self._pedals[name]["pedal"].tare()
+        return "done"
 
-    def get_bits(self, msg):
+    def get_oversample(self, args):
         """
-        Send the bit depths (raw and HID) of all pedals via serial.
+        Report each pedal's oversampling and the resulting resolution:
+        OVERSAMPLE:T:<samples>:<mode>:<effective bits>,B:...  e.g. OVERSAMPLE:T:16:average:12.0,B:1:off:20.0
         """
-        if "GetBits" in msg:
-            print("Processing GetBits command")  # Debug line
-            try:
-                bits_values = []
-                for name in self._pedals.keys():
-                    raw_bit = self._pedals[name]["pedal"]._raw_bit
-                    hid_bit = self._pedals[name]["pedal"]._hid_bit
-                    bits_values.append(f"{raw_bit}-{hid_bit}")
-
-                result = "-".join(bits_values)
-                print(f"Bit values: {result}")  # Debug line
-                usb_cdc.console.write(f"BITS:{result}\n".encode("utf-8"))
-            except Exception as e:
-                print(f"Error in get_bits: {e}")  # Debug line
+        entries = []
+        for pedal in self._pedals.values():
+            oversampler = pedal["pedal"]._oversampler
+            samples, mode = (oversampler.samples, oversampler.mode) if oversampler else (1, "off")
+            entries.append(f"{pedal['prefix']}:{samples}:{mode}:{pedal['pedal'].get_effective_bits():.1f}")
+        return f"OVERSAMPLE:{','.join(entries)}"
+
+    def get_rates(self, args):
+        """
+        Report each pedal's nominal input and output rate in samples/s: RATES:T:1000:250,B:80:80,C:0:0
+        """
+        entries = []
+        for name, pedal in self._pedals.items():
+            sample_rate, output_rate = self._rates.get(name, (0, 0))
+            entries.append(f"{pedal['prefix']}:{int(sample_rate)}:{int(output_rate)}")
+        return f"RATES:{','.join(entries)}"
 
+    def get_all(self, args):
+        """
+        Report the full configuration of every pedal in one line: ALL:{"throttle":{...},...}
+        """
+        settings = self.storagehelper.read_from_settings()
+        pedals = {}
+        for name in self._pedals.keys():
+            config = settings.get(name) or {}
+            pedals[name] = {section: config[section] for section in PEDAL_SECTIONS if section in config}
+        return "ALL:" + json.dumps(pedals, separators=(",", ":"))
 
-    def update_inverted(self, msg):
+    def set_all(self, args):
         """
-        Update the inversion settings of all pedals based on the serial command.
+        Replace the configuration of one or more pedals in one round trip: SETALL:{"throttle":{...},...}
+        The payload is validated completely before anything is applied, then applied and persisted at once.
+        If a pedal can't be configured (e.g. no free ADS channel), nothing is persisted and the
+        stored configuration is restored.
         """
-        if "INVER:" in msg:
-            print(f"Processing INVER command: {msg}")  # Debug line
-            try:
-                split_inverted = utilLib.get_value(msg, ',', 0).replace("INVER:", "").split("-")
-                for name, inverted in zip(self._pedals.keys(), split_inverted):
-                    self._pedals[name]["pedal"].set_inverted_values(int(inverted))
-                print(f"Updated inverted values: {split_inverted}")  # Debug line
-            except Exception as e:
-                print(f"Error in update_inverted: {e}")  # Debug line
+        try:
+            pedals = json.loads(args[0])
+        except ValueError:
+            raise CommandError("invalid JSON")
+        if not isinstance(pedals, dict):
+            raise CommandError("expected a JSON object")
+        for name, config in pedals.items():
+            if name not in self._pedals:
+                raise CommandError(f"unknown pedal {name}")
+            self.validate_pedal_config(name, config)
+
+        settings = json.loads(json.dumps(self.storagehelper.read_from_settings()))
+        for name, config in pedals.items():
+            settings.setdefault(name, {}).update(config)
+        errors = {}
+        self.apply_settings(settings, errors)
+        if errors:
+            self.apply_settings(self.storagehelper.read_from_settings())
+            name, error = next(iter(errors.items()))
+            raise CommandError(f"{name}: {error}")
+        self.storagehelper.write_settings(settings)
+        return "done"
+
+    @staticmethod
+    def validate_pedal_config(name, config):
+        """
+        Check a pedal configuration from SETALL.
+        :raises CommandError: On the first invalid section.
+        """
+        if not isinstance(config, dict):
+            raise CommandError(f"{name}: expected an object")
+        for section, value in config.items():
+            if section not in PEDAL_SECTIONS:
+                raise CommandError(f"{name}: unknown section {section}")
+            if section in ("on", "inverted", "smooth"):
+                valid = isinstance(value, bool)
+            elif section == "bits":
+                valid = isinstance(value, dict) and all(label in BIT_DEPTH_MAP for label in value.values()) and \
+                    BIT_DEPTH_MAP.get(value.get("hid", "16bit"), 0) <= HID_MAX
+            elif section == "calibration":
+                valid = isinstance(value, list) and len(value) == 4 and all(isinstance(v, int) for v in value)
+            elif section == "output_map":
+                valid = isinstance(value, list) and len(value) == 6 and all(
+                    isinstance(v, int) and 0 <= v <= 100 for v in value)
+            elif section == "input":
+                valid = isinstance(value, dict) and value.get("type") in INPUT_TYPES
+            elif section == "oversample":
+                valid = isinstance(value, dict) and isinstance(value.get("samples"), int) and \
+                    value["samples"] >= 1 and value.get("mode", "average") in OVERSAMPLE_MODES and \
+                    isinstance(value.get("stages", 3), int) and value.get("stages", 3) >= 1
+            else:
+                valid = isinstance(value, dict)
+            if not valid:
+                raise CommandError(f"{name}: invalid {section}")
 
+    def handle_stream(self, args):
+        """
+        Subscribe to telemetry: STREAM:<pedals|all>:<fields>[:<decimation>], e.g. STREAM:T,B:raw,after:10.
+        STREAM:OFF stops streaming.
+        """
+        if args[0] == "OFF":
+            self.telemetry.stop()
+            return "done"
+        if len(args) < 2:
+            raise CommandError("expected <pedals>:<fields>[:<decimation>]")
+        names = self._pedals.keys() if args[0] == "all" else [self.resolve_pedal(key) for key in args[0].split(",")]
+        pedals = [(self._pedals[name]["prefix"], self._pedals[name]["pedal"]) for name in names]
+        decimation = int(args[2]) if len(args) > 2 else 1
+        self.telemetry.subscribe(pedals, args[1].split(","), decimation)
+        return "done"
 
-    def update_smooth(self, msg):
+    def get_stream(self, args):
         """
-        Update the smoothing settings of all pedals based on the serial command.
+        Report the telemetry subscription: STREAM:<prefixes>:<fields>:<decimation>:<sent>:<dropped> or STREAM:OFF.
         """
-        if "SMOOTH:" in msg:
-            print(f"Processing SMOOTH command: {msg}")  # Debug line
-            try:
-                split_smooth = utilLib.get_value(msg, ',', 0).replace("SMOOTH:", "").split("-")
-                for name, smooth in zip(self._pedals.keys(), split_smooth):
-                    self._pedals[name]["pedal"].set_smooth_values(int(smooth))
-                print(f"Updated smoothing values: {split_smooth}")  # Debug line
-            except Exception as e:
-                print(f"Error in update_smooth: {e}")  # Debug line
+        return self.telemetry.status()
+
+    def get_boot_trace(self, args):
+        """
+        Report the startup phase timings in the format BOOT:phase=total/delta,... (ms).
+        """
+        return boot_trace.report()
 
+    def get_imports(self, args):
+        """
+        Report the on-demand driver imports in the format IMPORTS:module=ms/bytes,...
+        """
+        return boot_trace.import_report()
+
+    def get_i2c(self, args):
+        """
+        Report the bus health in the format I2C:<state>:<recoveries>:<address>=<errors>,... or I2C:OFF.
+        """
+        if self.i2c_health is None:
+            return "I2C:OFF"
+        return self.i2c_health.report()
+
+    def get_profiles(self, args):
+        """
+        Report the stored profile names and the active profile in the format PROFILES:active;a,b,c.
+        """
+        names = ",".join(self._profiles.keys())
+        return f"PROFILES:{self._active_profile or ''};{names}"
+
+    def handle_profile_command(self, args):
+        """
+        Handle PROFILE:<name> (switch), PROFILE:SAVE:<name> (store current settings) and PROFILE:DEL:<name>.
+        """
+        if len(args) == 2 and args[0] == "SAVE":
+            self.save_profile(args[1])
+        elif len(args) == 2 and args[0] == "DEL":
+            if args[1] not in self._profiles:
+                raise CommandError(f"unknown profile {args[1]}")
+            self.delete_profile(args[1])
+        elif len(args) == 1:
+            if args[0] not in self._profiles:
+                raise CommandError(f"unknown profile {args[0]}")
+            self.switch_profile(args[0])
+            self.storagehelper.set_active_profile(self._active_profile)
+        else:
+            raise CommandError("expected <name>, SAVE:<name> or DEL:<name>")
+        return "done"
 
     ### Generic Getter and Setter Methods ###
     def set_pedal_on(self, pedal_name, on):
         """
-        Set the on/off state for a pedal.
+        Set the on/off state for a pedal. Enabling a pedal configures its input and disabling it
+        releases the input again. The state is only stored once the sample rates could be tuned
+        for it; otherwise the previous state is restored and the error raised.
         """
+        previous = self._on_states[pedal_name]
+        configured = on and self._pedals[pedal_name]["pedal"].backend is None
+        if configured:
+            self.configure_input(pedal_name)
         self._on_states[pedal_name] = on
-        utilLib.write_to_settings(f"{pedal_name}.on", on)
+        try:
+            self.tune_rates()
+        except Exception:
+            self._on_states[pedal_name] = previous
+            if configured:
+                self.release_input(pedal_name)
+            self.tune_rates()
+            raise
+        if not on:
+            self.release_input(pedal_name)
+        self.update_active()
+        self.storagehelper.write_to_settings(f"{pedal_name}.on", on)
+        self.mark_applied(pedal_name, "on", on)
+        self.invalidate_responses()
+
+    def configure_input(self, pedal_name):
+        """
+        Configure the stored input of a pedal that was set up while disabled.
+        """
+        input_config = self.storagehelper.read_from_settings(f"{pedal_name}.input")
+        wiring = self.wire_ads_inputs(self.storagehelper.read_from_settings())
+        if pedal_name in wiring:
+            address, channel = wiring[pedal_name]
+            input_config = dict(input_config, address=address, channel=channel)
+        tare = self.storagehelper.read_from_settings(f"{pedal_name}.tare")
+        self._pedals[pedal_name]["pedal"].configure({"input": input_config, "tare": tare}, ["input"])
+        self.mark_applied(pedal_name, "input", json.loads(json.dumps(input_config)))
+
+    def release_input(self, pedal_name):
+        """
+        Release the input of a disabled pedal so its pins, driver and ADS channel are free.
+        """
+        self._pedals[pedal_name]["pedal"].release_input()
+        self.mark_applied(pedal_name, "input", None)
 
     def get_pedal_on(self, pedal_name):
         """
         Retrieve the on/off state for a pedal.
         """
-        return utilLib.read_from_settings(f"{pedal_name}.on") or False
+        return self.storagehelper.read_from_settings(f"{pedal_name}.on") or False
 
-    def set_pedal_bits(self, pedal_name):
+    def set_pedal_bits(self, pedal_name, raw_label, hid_label):
         """
-        Set the raw and HID bit depths for a pedal using values from settings.
+        Set the raw and HID bit depths for a pedal from labels such as "10bit" and store them.
         """
-        pedal = self._pedals[pedal_name]
-        bits = utilLib.read_from_settings(pedal_name).get("bits", {})
-        raw_bit = get_bit_depth(bits.get("raw", "16bit"))
-        hid_bit = get_bit_depth(bits.get("hid", "16bit"))
-        pedal.set_bits(raw_bit, hid_bit)
-        utilLib.write_to_settings(f"{pedal_name}.bits", {"raw": raw_bit, "hid": hid_bit})
+        pedal = self._pedals[pedal_name]["pedal"]
+        pedal.set_bits(get_bit_depth(raw_label), get_bit_depth(hid_label))
+        self.storagehelper.write_to_settings(f"{pedal_name}.bits", {"raw": raw_label, "hid": hid_label})
+        self.mark_applied(pedal_name, "bits", {"raw": raw_label, "hid": hid_label})
+        self.refresh_profiles()
+        self.invalidate_responses()
 
     def get_pedal_bits(self, pedal_name):
         """
         Retrieve the raw and HID bit depths for a pedal.
         """
-        bits = utilLib.read_from_settings(pedal_name).get("bits", {})
+        bits = self.storagehelper.read_from_settings(pedal_name).get("bits", {})
         raw_bit = get_bit_depth(bits.get("raw", "16bit"))
         hid_bit = get_bit_depth(bits.get("hid", "16bit"))
         return raw_bit, hid_bit
 
-    def set_pedal_input(self, pedal_name, input_type, **kwargs):
-        """
-        Set the input configuration for a pedal.
-        :param pedal_name: The pedal name (e.g., "throttle").
-        :param input_type: The type of input (e.g., "Analog", "Loadcell").
-        :param kwargs: Additional configuration details (e.g., pin or DOUT/CLK pins).
-        """
-        pedal = self._pedals[pedal_name]
-        if input_type == "Analog":
-            pedal.config_analog(kwargs.get("pin"))
-            utilLib.write_to_settings(f"{pedal_name}.input", {"type": "Analog", "pin": kwargs["pin"]})
-        elif input_type == "Loadcell":
-            pedal.config_load_cell(kwargs["DOUT"], kwargs["CLK"])
-            utilLib.write_to_settings(f"{pedal_name}.input", {"type": "Loadcell", "pins": {"DOUT": kwargs["DOUT"], "CLK": kwargs["CLK"]}})
-
     def get_pedal_input(self, pedal_name):
         """
         Retrieve the input configuration for a pedal.
         """
-        return utilLib.read_from_settings(f"{pedal_name}.input")
+        return self.storagehelper.read_from_settings(f"{pedal_name}.input")
 
     ### Configuration Loading ###
     def load_settings(self):
         """
         Load all settings from storage. If the device has not been initialized, reset all settings to defaults.
         """
-        initialized = utilLib.read_from_settings(E_INIT)
+        initialized = self.storagehelper.read_from_settings(E_INIT)
         if initialized:
-            for name in self._pedals.keys():
-                self.set_pedal_on(name, self.get_pedal_on(name))
-                self.set_pedal_bits(name)
-                input_config = self.get_pedal_input(name)
-                if input_config:
-                    if input_config["type"] == "Analog":
-                        self.set_pedal_input(name, "Analog", pin=input_config["pin"])
-                    elif input_config["type"] == "Loadcell":
-                        pins = input_config["pins"]
-                        self.set_pedal_input(name, "Loadcell", DOUT=pins["DOUT"], CLK=pins["CLK"])
-            # Apply global inversion and smoothing settings
-            self.update_inverted(f"INVER:{utilLib.read_from_settings(E_PEDAL_INVERTED_MAP)}")
-            self.update_smooth(f"SMOOTH:{utilLib.read_from_settings(E_PEDAL_SMOOTH_MAP)}")
+            settings = self.storagehelper.read_from_settings()
+            self.apply_settings(settings)
 
             # Validate pinout configuration
-            settings = utilLib.read_from_settings()
-            if settings:
-                check_pinout(settings)
-            else:
-                print("Warning: No settings available to validate pinout.")
+            check_pinout(settings)
         else:
             self.reset_device_settings()
 
+    ### Live Reconfiguration ###
+    @staticmethod
+    def diff_pedal_config(old, new):
+        """
+        Compare two pedal configurations and return the sections that differ.
+        :param old: The previously applied pedal configuration (or None).
+        :param new: The new pedal configuration.
+        :return: A list of changed section names from PEDAL_SECTIONS.
+        """
+        old = old or {}
+        return [section for section in PEDAL_SECTIONS if old.get(section) != new.get(section)]
+
+    def mark_applied(self, name, section, value):
+        """
+        Record a section a command changed on the pedal directly, so the next apply_settings
+        compares against what the pedal actually runs.
+        """
+        self._applied.setdefault(name, {})[section] = value
+
+    def apply_settings(self, settings, errors=None):
+        """
+        Apply a full settings document, rebuilding only the pedals whose configuration changed.
+        Pedals that did not change keep their backend, filter state and curve untouched.
+        A pedal that can't be configured is turned off.
+        :param settings: The settings dictionary (same layout as settings.json).
+        :param errors: Optional dictionary that receives pedal name -> error for pedals that failed.
+        :return: A dictionary mapping pedal names to the sections that were rebuilt.
+        """
+        changes = {}
+        wiring = self.wire_ads_inputs(settings)
+        for name, entry in self._pedals.items():
+            config = settings.get(name)
+            if not isinstance(config, dict):
+                continue
+            if name in wiring:
+                address, channel = wiring[name]
+                config = dict(config, input=dict(config["input"], address=address, channel=channel))
+            if not config.get("on"):
+                # Disabled pedals don't claim pins or import drivers; SetUsage configures the input
+                config = dict(config)
+                config.pop("input", None)
+            sections = self.diff_pedal_config(self._applied.get(name), config)
+            if not sections:
+                continue
+            try:
+                entry["pedal"].configure(config, sections)
+            except Exception as e:
+                print(f"Error applying {name} settings: {e}")
+                self._on_states[name] = False
+                # The pedal may be half configured, so the next apply rebuilds it completely
+                self._applied.pop(name, None)
+                if errors is not None:
+                    errors[name] = e
+                continue
+            self._on_states[name] = bool(config.get("on", False))
+            # Keep a private copy so later edits to the settings cache are detected as changes
+            self._applied[name] = json.loads(json.dumps(config))
+            changes[name] = sections
+        self.update_active()
+        print(f"Applied settings changes: {changes}")
+        if changes:
+            self.invalidate_responses()
+            try:
+                self.tune_rates()
+            except ValueError as e:
+                print(f"Error tuning sample rates: {e}")
+
+        if changes:
+            self.refresh_profiles()
+        return changes
+
+    def wire_ads_inputs(self, settings):
+        """
+        Find ADS1x15 channels for the ADS pedals configured with "channel": "auto", using the
+        devices found by the boot-time bus scan. The stored settings keep "auto".
+        :return: Dictionary pedal name -> (address, channel).
+        """
+        inputs = []
+        for name in self._pedals.keys():
+            input_config = (settings.get(name) or {}).get("input") or {}
+            if input_config.get("type") == "ADS":
+                inputs.append((name, input_config))
+        if not inputs:
+            return {}
+        from ads_devices import assign_channels
+        wiring = assign_channels(inputs)
+        for name, input_config in inputs:
+            if input_config.get("channel", "auto") == "auto" and name not in wiring:
+                print(f"{name}: no free ADS1x15 channel found on the bus")
+        return wiring
+
+    def reload_settings(self):
+        """
+        Re-read the settings file and apply any differences while the loop keeps running.
+        """
+        self.storagehelper.reload()
+        return self.apply_settings(self.storagehelper.read_from_settings())
+
+    ### Named Profiles ###
+    def compile_profiles(self):
+        """
+        Precompile every stored profile into ready-to-run pipelines for each pedal.
+        """
+        store = self.storagehelper.read_profiles()
+        self._profiles = {}
+        for profile_name, profile in store["profiles"].items():
+            self._profiles[profile_name] = {
+                name: entry["pedal"].compile_pipeline(profile.get(name, {}))
+                for name, entry in self._pedals.items()
+            }
+
+    def refresh_profiles(self):
+        """
+        Profiles are compiled against the pedal settings, so recompile them after a setting changed
+        and keep the active one running. Without this a setter would leave its pedal on the base
+        pipeline while the profile is still reported as active.
+        """
+        if not self._profiles:
+            return
+        self.compile_profiles()
+        if self._active_profile in self._profiles:
+            self.switch_profile(self._active_profile)
+        else:
+            self._active_profile = None
+
+    def load_profiles(self):
+        """
+        Compile the stored profiles and restore the profile that was active at shutdown.
+        """
+        self.compile_profiles()
+        active = self.storagehelper.get_active_profile()
+        if active in self._profiles:
+            self.switch_profile(active)
+
+    def switch_profile(self, profile_name):
+        """
+        Switch all pedals to a precompiled profile. Only swaps references, so it is safe mid-loop.
+        :raises KeyError: If the profile does not exist.
+        """
+        compiled = self._profiles[profile_name]
+        for name, entry in self._pedals.items():
+            entry["pedal"].use_pipeline(compiled[name])
+        self._active_profile = profile_name
+        self.invalidate_responses()
+        print(f"Switched to profile {profile_name}")
+
+    def save_profile(self, profile_name):
+        """
+        Store the pedals' current curve, calibration, filter and inversion settings as a named profile.
+        """
+        profile = {}
+        for name, entry in self._pedals.items():
+            config = entry["pedal"].compile_pipeline().to_config()
+            profile[name] = {key: config[key] for key in PROFILE_KEYS}
+        self.storagehelper.write_profile(profile_name, profile)
+        self._profiles[profile_name] = {
+            name: entry["pedal"].compile_pipeline(profile[name]) for name, entry in self._pedals.items()
+        }
+
+    def delete_profile(self, profile_name):
+        """
+        Remove a named profile from storage and RAM.
+        :raises KeyError: If the profile does not exist.
+        """
+        del self._profiles[profile_name]
+        self.storagehelper.delete_profile(profile_name)
+        if self._active_profile == profile_name:
+            self._active_profile = None
+
+    def setup_profile_button(self):
+        """
+        Configure the optional profile button from the "profile_button" setting.
+        """
+        button_config = self.storagehelper.read_from_settings("profile_button")
+        if not button_config:
+            return
+        import board
+        import digitalio
+
+        button = digitalio.DigitalInOut(getattr(board, button_config["pin"]))
+        button.switch_to_input(pull=digitalio.Pull.UP)
+        self._profile_button = button
+
+    def poll_profile_button(self):
+        """
+        Cycle to the next profile on a button press (falling edge, button pulls to ground).
+        """
+        pressed = not self._profile_button.value
+        if pressed and self._profile_button_released and self._profiles:
+            names = list(self._profiles.keys())
+            index = names.index(self._active_profile) + 1 if self._active_profile in names else 0
+            self.switch_profile(names[index % len(names)])
+        self._profile_button_released = not pressed
+
     ### Device Reset ###
     def reset_device_settings(self):
         """
-        Reset all pedal-related settings to defaults and reboot the device.
+        Reset all pedal-related settings to defaults and apply them live, without rebooting.
         """
-        utilLib.write_to_storage(E_INIT, True)
-        for name in self._pedals.keys():
-            pedal = self._pedals[name]
-            pedal.reset_output_map_values(f"{name}_output_map")
-            pedal.reset_calibration_values(f"{name}_calibration")
-        utilLib.write_to_settings(E_PEDAL_INVERTED_MAP, "0-0-0")
-        utilLib.write_to_settings(E_PEDAL_SMOOTH_MAP, "1-1-1")
-        print("Resetting device...")
-        time.sleep(1)
-        microcontroller.reset()
\ No newline at end of file
+        print("Resetting device settings...")
+        self.storagehelper.reset_to_defaults()
+        self.storagehelper.reload()
+        self.storagehelper.write_to_settings(E_INIT, True)
+        self.apply_settings(self.storagehelper.read_from_settings())
@@ -0,0 +1,252 @@
+# ads_devices.py
+
+import time
+
+from boot_trace import boot_trace
+
+# ADS1x15 MUX settings 4-7 select a single-ended input (AINx against GND); 0-3 are differential pairs
+SINGLE_ENDED_MUX = 0x04
+# ADS1x15 conversion modes (adafruit_ads1x15.ads1x15.Mode)
+MODE_CONTINUOUS = 0x0000
+MODE_SINGLE = 0x0100
+DEFAULT_ADDRESS = 0x48
+
+# Devices by (bus, address), so every pedal wired to the same ADS1115 shares one driver and configuration
+_devices = {}
+# ADS1x15 addresses that answered the boot-time bus scan
+_discovered = []
+# i2c_health.I2CHealth watching the bus, if any
+_health = None
+# Single-ended inputs per device
+CHANNELS = 4
+# A deinitialised or recreated bus raises ValueError or RuntimeError rather than OSError;
+# all of them count as a failed transfer
+TRANSFER_ERRORS = (OSError, RuntimeError, ValueError)
+# Conversions a single-shot read waits for before the device counts as not responding
+CONVERSION_TIMEOUT = 4
+
+
+class ADSDevice:
+    """
+    One ADS1x15 shared by the pedals wired to its inputs.
+
+    With one channel the ADC runs continuously and a read only fetches the conversion register.
+    With several channels it converts them in turn in single-shot mode: reading one channel
+    starts the conversion of the next, so it converts while the loop does other work and its
+    sampler finds it ready instead of waiting.
+
+    Failed transfers are counted and reported to the bus health monitor. While the bus is being
+    recovered the device is unavailable: ready() returns False and read() raises OSError.
+    """
+
+    def __init__(self, ads, address=DEFAULT_ADDRESS, health=None):
+        """
+        :param ads: An adafruit_ads1x15 ADS1115/ADS1015 instance.
+        :param address: The device's I2C address.
+        :param health: Optional i2c_health.I2CHealth to report transfer errors to.
+        """
+        self.ads = ads
+        self.address = address
+        self.health = health
+        self.errors = 0  # Failed transfers since boot
+        self.channels = []  # Channels of every pedal wired to this device
+        self.sequence = []  # Channels of the enabled pedals, in conversion order
+        self._pending = None  # Channel whose single-shot conversion is running
+
+    @property
+    def available(self):
+        return self.health is None or self.health.ready
+
+    def _failed(self, error):
+        self.errors += 1
+        self._pending = None  # Start over with a fresh conversion
+        if self.health is not None:
+            self.health.record_error(self.address, error)
+
+    def add_channel(self, channel):
+        if channel not in self.channels:
+            self.channels.append(channel)
+            self.channels.sort()
+            self.sequence = list(self.channels)
+        self._pending = None
+
+    def remove_channel(self, channel):
+        """
+        :return: True if no channels are left.
+        """
+        if channel in self.channels:
+            self.channels.remove(channel)
+        if channel in self.sequence:
+            self.sequence.remove(channel)
+        self._pending = None
+        return not self.channels
+
+    def configure(self, sequence, data_rate, mode, gain):
+        """
+        Apply a channel sequence, data rate, conversion mode and gain (already validated against the driver).
+        :param sequence: The channels to convert in turn, i.e. those of the enabled pedals.
+        """
+        self.sequence = sorted(sequence)
+        ads = self.ads
+        ads.gain = gain
+        ads.data_rate = data_rate
+        ads.mode = mode
+        ads._last_pin_read = None  # Force the new configuration to be written on the next read
+        self._pending = None
+
+    def _start(self, channel):
+        self.ads._write_config(channel + SINGLE_ENDED_MUX)
+        self._pending = channel
+
+    def ready(self, channel):
+        """
+        Check whether a read of channel can return without waiting for a conversion.
+        """
+        if not self.available:
+            return False
+        if self.ads.mode == MODE_CONTINUOUS:
+            return True
+        try:
+            if self._pending is None:
+                self._start(channel)
+                return False
+            if self._pending != channel:
+                return False
+            return bool(self.ads._conversion_complete())
+        except TRANSFER_ERRORS as e:
+            self._failed(e)
+            return False
+
+    def read(self, channel):
+        """
+        Read a single-ended channel, waiting for its conversion if necessary.
+        :return: The signed conversion result.
+        :raises OSError: If the transfer failed, the conversion timed out or the bus is being recovered.
+        """
+        if not self.available:
+            raise OSError("I2C bus is recovering")
+        try:
+            value = self._read(channel)
+        except TRANSFER_ERRORS as e:
+            self._failed(e)
+            raise OSError(f"ADS1x15 at {hex(self.address)}: {e}")
+        if self.health is not None:
+            self.health.record_success(self.address)
+        return value
+
+    def _read(self, channel):
+        ads = self.ads
+        if ads.mode == MODE_CONTINUOUS:
+            return ads.read(channel + SINGLE_ENDED_MUX)
+
+        if self._pending != channel:
+            self._start(channel)
+        # A wedged device never completes the conversion; don't hang the loop on it
+        deadline = time.monotonic_ns() + CONVERSION_TIMEOUT * 1_000_000_000 // ads.data_rate
+        while not ads._conversion_complete():
+            if time.monotonic_ns() > deadline:
+                raise OSError("conversion timed out")
+        value = ads._conversion_value(ads.get_last_result(False))
+
+        # Start the next channel in the sequence right away
+        sequence = self.sequence
+        if len(sequence) > 1 and channel in sequence:
+            self._start(sequence[(sequence.index(channel) + 1) % len(sequence)])
+        else:
+            self._pending = None
+        return value
+
+
+def get_device(i2c, address=DEFAULT_ADDRESS):
+    """
+    Return the shared device at address on the bus, creating its driver on first use.
+    """
+    if _health is not None:
+        i2c = _health.i2c  # The bus may have been recreated by a recovery
+    key = (id(i2c), address)
+    device = _devices.get(key)
+    if device is None:
+        ADS1115 = boot_trace.import_module("adafruit_ads1x15.ads1115").ADS1115
+        device = ADSDevice(ADS1115(i2c, address=address), address, _health)
+        _devices[key] = device
+    return device
+
+
+def devices():
+    """
+    :return: All devices in use.
+    """
+    return list(_devices.values())
+
+
+def release_channel(device, channel):
+    """
+    Remove a channel from a device and forget the device when no pedal uses it any more.
+    """
+    if device.remove_channel(channel):
+        for key, existing in list(_devices.items()):
+            if existing is device:
+                del _devices[key]
+
+
+def set_health(health):
+    """
+    Report the transfer errors of every device to health, and move the devices to the new bus
+    whenever it recovers one.
+    """
+    global _health
+    _health = health
+    for device in _devices.values():
+        device.health = health
+    health.add_listener(rebind)
+
+
+def rebind(i2c):
+    """
+    Point every device's driver at a recreated busio.I2C. The native I2CDevice can't be moved to
+    another bus, so each driver gets a new one.
+    """
+    from adafruit_bus_device.i2c_device import I2CDevice
+
+    for key, device in list(_devices.items()):
+        # Don't probe: a device that is still missing must not stop the others from being rebound
+        device.ads.i2c_device = I2CDevice(i2c, device.address, probe=False)
+        device.ads._last_pin_read = None  # Write the configuration again on the next read
+        device._pending = None
+        del _devices[key]
+        _devices[(id(i2c), key[1])] = device
+
+
+def set_discovered(addresses):
+    """
+    Remember the ADS1x15 addresses found on the bus.
+    """
+    _discovered[:] = sorted(addresses)
+
+
+def discovered():
+    return list(_discovered)
+
+
+def assign_channels(inputs):
+    """
+    Wire ADS inputs configured with "channel": "auto" (or without a channel) to free inputs of the
+    discovered devices, in order. Inputs with an explicit channel keep it and are never handed out.
+    :param inputs: List of (name, input config) pairs for the ADS pedals, in pedal order.
+    :return: Dictionary name -> (address, channel) for the inputs that could be wired.
+    """
+    used = set()
+    automatic = []
+    for name, input_config in inputs:
+        channel = input_config.get("channel", "auto")
+        if channel == "auto":
+            automatic.append(name)
+        else:
+            used.add((input_config.get("address", DEFAULT_ADDRESS), channel))
+
+    free = [(address, channel) for address in _discovered for channel in range(CHANNELS)
+            if (address, channel) not in used]
+    wiring = {}
+    for name, slot in zip(automatic, free):
+        wiring[name] = slot
+    return wiring
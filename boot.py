@@ -1,4 +1,7 @@
-from simple.boot import gamepad_descriptor
+from boot_trace import boot_trace
+boot_trace.mark("boot.start")
+from simple.boot import gamepad_device
+from pedal_registry import read_axes
 import usb_hid
 import usb_cdc
 import supervisor
@@ -27,9 +30,20 @@ MANUFACTURER_NAME = "Custom Sim Hardware"
 
 # Set USB identification
 supervisor.set_usb_identification(vid=CUSTOM_VID, pid=CUSTOM_PID, manufacturer=MANUFACTURER_NAME, product=PRODUCT_NAME)
+boot_trace.mark("boot.usb_identification")
 
 
+# One HID axis per pedal in the settings' pedal registry
+gamepad_descriptor = gamepad_device(read_axes())
+
 # Set interface name for the gamepad
 usb_hid.enable(gamepad_descriptor, boot_device=1)
 usb_hid.set_interface_name("PedalBox")
-usb_cdc.enable(console=True, data=True)
\ No newline at end of file
+boot_trace.mark("boot.usb_hid")
+usb_cdc.enable(console=True, data=True)
+boot_trace.mark("boot.usb_cdc")
+
+# Hand the marks over to code.py through boot_out.txt, only when "boot_trace": true is set in
+# settings.json: the stamps differ on every boot, and a changed boot_out.txt is rewritten on flash
+if boot_trace.dump_enabled():
+    boot_trace.dump()
@@ -0,0 +1,126 @@
+# boot_trace.py
+
+import gc
+import json
+import sys
+import time
+
+TRACE_PREFIX = "TRACE:"
+
+
+class BootTrace:
+    """
+    Timestamps startup phases from power-on to the first HID report and keeps them in RAM.
+    Marks are ignored once the trace is finished, so calls left in runtime paths cost nothing.
+    """
+
+    def __init__(self):
+        self.active = True
+        self._marks = []  # (phase, monotonic_ns)
+        self._imports = []  # (module, milliseconds, bytes of heap used or None)
+
+    def mark(self, phase):
+        """
+        Record that a startup phase has been reached.
+        :param phase: A short dotted name, e.g. "pedals.setup".
+        """
+        if self.active:
+            self._marks.append((phase, time.monotonic_ns()))
+
+    def finish(self, phase="loop.first_report"):
+        """
+        Record the final phase and stop tracing.
+        """
+        self.mark(phase)
+        self.active = False
+
+    def dump(self):
+        """
+        Print every mark in TRACE:<phase>:<ns> form. boot.py output lands in boot_out.txt,
+        which is how its marks reach the code.py trace.
+        """
+        for phase, stamp in self._marks:
+            print(f"{TRACE_PREFIX}{phase}:{stamp}")
+
+    @staticmethod
+    def dump_enabled(settings_path="settings.json"):
+        """
+        Check whether settings.json asks for the boot.py marks ("boot_trace": true). Without them
+        the trace starts at code.py.
+        """
+        try:
+            with open(settings_path, "r") as f:
+                return bool(json.load(f).get("boot_trace", False))
+        except (OSError, ValueError):
+            return False
+
+    def load_boot_out(self, file_path="boot_out.txt"):
+        """
+        Import the marks that boot.py dumped into boot_out.txt, ahead of the marks recorded here.
+        Monotonic time keeps counting across the boot.py and code.py runs, so the stamps line up.
+        """
+        marks = []
+        try:
+            with open(file_path, "r") as f:
+                for line in f:
+                    if line.startswith(TRACE_PREFIX):
+                        phase, stamp = line[len(TRACE_PREFIX):].strip().rsplit(":", 1)
+                        marks.append((phase, int(stamp)))
+        except (OSError, ValueError):
+            return
+        self._marks = marks + self._marks
+
+    def import_module(self, name):
+        """
+        Import a module on demand, recording how long it took and how much heap it used.
+        Modules that are already loaded are returned without being recorded again.
+        :param name: The full dotted module name, e.g. "adafruit_hx711.hx711".
+        :return: The module object.
+        """
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        mem_free = getattr(gc, "mem_free", None)
+        if mem_free:
+            gc.collect()
+            before = mem_free()
+        start = time.monotonic_ns()
+        __import__(name)
+        elapsed = (time.monotonic_ns() - start) / 1e6
+        used = before - mem_free() if mem_free else None
+        self._imports.append((name, elapsed, used))
+        self.mark(f"import.{name}")
+        return sys.modules[name]
+
+    def import_report(self):
+        """
+        Format the on-demand imports as a single serial line: IMPORTS:module=ms/bytes,...
+        The byte count is "?" where the heap size is not available (e.g. on CPython).
+        """
+        entries = [
+            f"{name}={elapsed:.1f}/{'?' if used is None else used}" for name, elapsed, used in self._imports
+        ]
+        return "IMPORTS:" + ",".join(entries)
+
+    def phases(self):
+        """
+        Return (phase, ms since the first mark, ms since the previous mark) for every mark.
+        """
+        result = []
+        if not self._marks:
+            return result
+        start = previous = self._marks[0][1]
+        for phase, stamp in self._marks:
+            result.append((phase, (stamp - start) / 1e6, (stamp - previous) / 1e6))
+            previous = stamp
+        return result
+
+    def report(self):
+        """
+        Format the trace as a single serial line: BOOT:phase=total/delta,... (milliseconds).
+        """
+        entries = [f"{phase}={total:.1f}/{delta:.1f}" for phase, total, delta in self.phases()]
+        return "BOOT:" + ",".join(entries)
+
+
+boot_trace = BootTrace()
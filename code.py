@@ -1,18 +1,27 @@
+from boot_trace import boot_trace
+boot_trace.load_boot_out()
+boot_trace.mark("code.start")
 from Pedals import Pedals
 from configurable_I2C import ConfigurableI2C
+boot_trace.mark("code.imports")
 
 # Create Pedals instance
 class PedalController:
     def __init__(self):
         # Initialize Storage
         self.storagehelper = self.initialize_storage()
+        boot_trace.mark("controller.storage")
 
         # Configure and initialize I2C
+        self.i2c_health = None
         self.i2c = self.initialize_i2c()
+        boot_trace.mark("controller.i2c")
 
         # Initialize Pedals with the configured I2C instance
-        self.pedals = Pedals(self.i2c)
+        self.pedals = Pedals(self.i2c, self.storagehelper, self.i2c_health)
+        boot_trace.mark("controller.pedals")
         self.setup()
+        boot_trace.mark("controller.setup")
 
     def initialize_storage(self):
         """
@@ -27,7 +36,9 @@ class PedalController:
         """
         try:
             configurable_i2c = ConfigurableI2C(self.storagehelper)
-            return configurable_i2c.initialize()
+            i2c = configurable_i2c.initialize()
+            self.i2c_health = configurable_i2c.health
+            return i2c
         except ValueError as e:
             print(f"Skipping I2C initialization: {e}")
             return None
@@ -45,8 +56,26 @@ class PedalController:
         self.pedals.loop()
 
     def run(self):
+        try:
+            from tasks import PedalTasks
+        except ImportError:
+            # The asyncio library isn't installed on the board; fall back to the single loop
+            PedalTasks = None
+
+        if PedalTasks is not None:
+            import asyncio
+            print("Starting pedal tasks...")
+            asyncio.run(PedalTasks(self.pedals).run())
+            return
+
+        print("Entering loop...")
+        # Sampling starts before USB is ready; the trace ends with the first HID report
+        while boot_trace.active:
+            self.loop()
+            if self.pedals.gamepad.attached:
+                boot_trace.finish()
+                print(boot_trace.report())
         while True:
-            print("Entering loop...")
             self.loop()
 
 if __name__ == "__main__":
@@ -1,5 +1,13 @@
 import board
 import busio
+import ads_devices
+from i2c_health import I2CHealth
+
+# Bus clocks busio.I2C is allowed to run at: standard, fast and fast-mode plus
+I2C_FREQUENCIES = (100_000, 400_000, 1_000_000)
+DEFAULT_FREQUENCY = 400_000
+# Addresses an ADS1x15 can take through its ADDR pin
+ADS_ADDRESSES = (0x48, 0x49, 0x4A, 0x4B)
 
 
 class ConfigurableI2C:
@@ -9,6 +17,7 @@ class ConfigurableI2C:
         :param storage: An instance of the Storage class.
         """
         self.storagehelper = storagehelper
+        self.health = None
 
     def initialize(self):
         """
@@ -20,10 +29,9 @@ class ConfigurableI2C:
         if not config:
             raise ValueError("Configuration is missing in the settings.")
 
-        # Check if load cell is enabled and input type is "Loadcell"
-        brake_config = config.get("brake", {})
-        if not brake_config.get("on", False) or brake_config.get("input", {}).get("type") != "Loadcell":
-            print("Load cell is disabled or not configured. Skipping I2C initialization.")
+        # Only ADS1x15 inputs use the bus
+        if not self.uses_ads(config):
+            print("No pedal uses an ADS1x15. Skipping I2C initialization.")
             return None
 
         i2c_config = config.get("i2c_config", {})
@@ -41,5 +49,42 @@ class ConfigurableI2C:
         if not sda_pin or not scl_pin:
             raise ValueError(f"Invalid I2C pins: SDA={sda_pin_name}, SCL={scl_pin_name}")
 
-        print(f"Initializing I2C with SDA={sda_pin_name}, SCL={scl_pin_name}")
-        return busio.I2C(scl_pin, sda_pin)
+        frequency = i2c_config.get("frequency", DEFAULT_FREQUENCY)
+        if frequency not in I2C_FREQUENCIES:
+            raise ValueError(f"Invalid I2C frequency {frequency}, expected one of {I2C_FREQUENCIES}")
+
+        print(f"Initializing I2C with SDA={sda_pin_name}, SCL={scl_pin_name} at {frequency} Hz")
+        i2c = busio.I2C(scl_pin, sda_pin, frequency=frequency)
+        self.scan(i2c)
+
+        # Count errors per device and free the bus when one keeps failing
+        self.health = I2CHealth(i2c, scl_pin, sda_pin, frequency, i2c_config.get("error_threshold", 3))
+        ads_devices.set_health(self.health)
+        return i2c
+
+    @staticmethod
+    def uses_ads(config):
+        """
+        Check whether any enabled pedal reads an ADS1x15.
+        """
+        for value in config.values():
+            if isinstance(value, dict) and value.get("on") and (value.get("input") or {}).get("type") == "ADS":
+                return True
+        return False
+
+    @staticmethod
+    def scan(i2c):
+        """
+        Probe the bus once for ADS1x15 converters and record the addresses found, so pedals
+        configured with "channel": "auto" can be wired to them.
+        :return: The ADS1x15 addresses that answered.
+        """
+        while not i2c.try_lock():
+            pass
+        try:
+            found = [address for address in i2c.scan() if address in ADS_ADDRESSES]
+        finally:
+            i2c.unlock()
+        ads_devices.set_discovered(found)
+        print(f"ADS1x15 found at: {', '.join(hex(address) for address in found) or 'none'}")
+        return found
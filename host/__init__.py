@@ -0,0 +1,5 @@
+"""
+Host-side tools for talking to the PedalBox over its USB CDC serial protocol.
+
+These modules run on the PC with CPython 3.8+ and are not copied to the device.
+"""
@@ -0,0 +1,202 @@
+"""
+Collects telemetry from several pedal boxes (or other devices speaking the same protocol)
+and serves one merged, time-aligned stream over a local TCP socket.
+
+Each device's frames are timestamped on arrival and mapped onto the host clock with a
+per-device offset estimate. At a fixed rate the newest frame of every device is merged into
+one JSON line and sent to every connected socket client.
+
+Usage::
+
+    python -m host.aggregator --port 8765 --fields raw,after --rate 100 /dev/ttyACM1 /dev/ttyACM3
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Sequence
+
+from host.client import PedalBoxClient, TelemetryFrame
+
+
+class DeviceClock:
+    """
+    Maps device milliseconds onto the host monotonic clock.
+    The offset is the smallest host-minus-device difference seen, which is the frame with the
+    least transport delay. The minimum is taken over a sliding pair of windows rather than the
+    whole session, so the estimate follows crystal drift between the clocks in either direction
+    (50 ppm is 180 ms per hour) instead of only ever decreasing.
+    """
+
+    def __init__(self, window: float = 10.0):
+        """
+        :param window: Seconds of host time per minimum window; the estimate uses the last two windows.
+        """
+        self.window = window
+        self.offset: Optional[float] = None
+        self._window_start: Optional[float] = None
+        self._current: Optional[float] = None  # Minimum of the running window
+        self._previous: Optional[float] = None  # Minimum of the window before it
+
+    def update(self, frame: TelemetryFrame) -> float:
+        """Fold a frame into the estimate and return its device time on the host clock."""
+        offset = frame.host_time - frame.device_ms / 1000
+        if self._window_start is None or frame.host_time - self._window_start >= self.window:
+            self._window_start = frame.host_time
+            self._previous = self._current
+            self._current = offset
+        elif offset < self._current:
+            self._current = offset
+        self.offset = self._current if self._previous is None else min(self._previous, self._current)
+        return frame.device_ms / 1000 + self.offset
+
+
+class Aggregator:
+    """Concurrent telemetry collector with a merged socket output."""
+
+    def __init__(self, urls: Sequence[str], fields: Sequence[str], pedals: Sequence[str] = ("all",),
+                 decimation: int = 1, rate: float = 100.0, max_client_buffer: int = 64 * 1024):
+        """
+        :param urls: Device URLs (serial/pty paths or tcp://host:port).
+        :param fields: Telemetry fields to subscribe to on every device.
+        :param pedals: Pedal names or prefixes to subscribe to, or ["all"].
+        :param decimation: Device-side decimation passed to STREAM.
+        :param rate: Merged frames per second sent to socket clients.
+        :param max_client_buffer: Bytes queued for a socket client before its frames are dropped.
+        """
+        self.urls = list(urls)
+        self.fields = list(fields)
+        self.pedals = list(pedals)
+        self.decimation = decimation
+        self.period = 1.0 / rate
+        self.max_client_buffer = max_client_buffer
+        self.clients: List[PedalBoxClient] = []
+        self._latest: Dict[str, dict] = {}
+        self._clocks: Dict[str, DeviceClock] = {}
+        self._writers: List[asyncio.StreamWriter] = []
+        self._tasks: List[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.sequence = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        """Connect to every device concurrently, subscribe, and start serving merged frames."""
+        self.clients = list(await asyncio.gather(*(PedalBoxClient.connect(url) for url in self.urls)))
+        for client in self.clients:
+            self._clocks[client.name] = DeviceClock()
+            self._tasks.append(asyncio.ensure_future(self._collect(client)))
+        # Subscribe only once every collector is listening, so no early frames are lost
+        await asyncio.gather(*(client.stream(self.pedals, self.fields, self.decimation) for client in self.clients))
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+        self._tasks.append(asyncio.ensure_future(self._publish_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in self._writers:
+            writer.close()
+        await asyncio.gather(*(self._close_client(client) for client in self.clients))
+
+    @staticmethod
+    async def _close_client(client: PedalBoxClient) -> None:
+        try:
+            await client.stop_stream()
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        await client.close()
+
+    @property
+    def port(self) -> Optional[int]:
+        """The listening port (useful when started with port 0)."""
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _collect(self, client: PedalBoxClient) -> None:
+        clock = self._clocks[client.name]
+        async for frame in client.telemetry():
+            self._latest[client.name] = {
+                "seq": frame.sequence,
+                "device_time": clock.update(frame),
+                "host_time": frame.host_time,
+                "values": frame.values,
+            }
+        self._latest.pop(client.name, None)
+
+    def merge(self, now: Optional[float] = None) -> dict:
+        """
+        Build one aligned frame from the newest data of every device.
+        Ages are how long before now each device's sample was taken, on the host clock.
+        """
+        now = time.monotonic() if now is None else now
+        devices = {}
+        for name, latest in self._latest.items():
+            devices[name] = {
+                "seq": latest["seq"],
+                "age_ms": round((now - latest["device_time"]) * 1000, 3),
+                "values": latest["values"],
+            }
+        self.sequence += 1
+        return {"seq": self.sequence, "t": now, "devices": devices}
+
+    async def _publish_loop(self) -> None:
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.period
+            if self._latest and self._writers:
+                self._broadcast((json.dumps(self.merge(), separators=(",", ":")) + "\n").encode("utf-8"))
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def _broadcast(self, data: bytes) -> None:
+        for writer in list(self._writers):
+            if writer.is_closing():
+                self._writers.remove(writer)
+            elif writer.transport.get_write_buffer_size() < self.max_client_buffer:
+                writer.write(data)
+            # else: a slow consumer only loses frames, it never stalls the others
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.append(writer)
+        try:
+            # Nothing is expected from consumers; wait until they disconnect
+            while await reader.read(1024):
+                pass
+        finally:
+            if writer in self._writers:
+                self._writers.remove(writer)
+            writer.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Merge telemetry from several pedal boxes onto one socket.")
+    parser.add_argument("devices", nargs="+", help="serial/pty paths or tcp://host:port URLs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fields", default="after", help="comma-separated telemetry fields")
+    parser.add_argument("--pedals", default="all", help="comma-separated pedal names or prefixes")
+    parser.add_argument("--decimation", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=100.0, help="merged frames per second")
+    args = parser.parse_args(argv)
+
+    async def run() -> None:
+        aggregator = Aggregator(args.devices, args.fields.split(","), args.pedals.split(","),
+                                args.decimation, args.rate)
+        await aggregator.start(args.host, args.port)
+        print(f"Serving merged telemetry from {len(args.devices)} devices on {args.host}:{aggregator.port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await aggregator.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
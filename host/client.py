@@ -0,0 +1,359 @@
+"""
+Asyncio client for the PedalBox serial protocol.
+
+One client owns one device connection. Commands are pipelined: each request is written
+immediately and its response future is resolved in order as response lines arrive.
+Telemetry frames (TEL:...) are split off the same stream and delivered through
+:meth:`PedalBoxClient.telemetry`.
+
+Usage::
+
+    client = await PedalBoxClient.connect("/dev/ttyACM1")
+    print(await client.get_bits())
+    await client.stream(["T", "B"], ["raw", "after"], decimation=4)
+    async for frame in client.telemetry():
+        print(frame.values["T"]["after"])
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+TELEMETRY_PREFIX = "TEL:"
+DONE = "done"
+
+
+class PedalBoxError(Exception):
+    """Raised when the device answers a command with ERR:<verb>:<reason>."""
+
+
+@dataclass
+class TelemetryFrame:
+    """One decoded TEL: line."""
+
+    sequence: int
+    device_ms: int
+    host_time: float
+    values: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+@dataclass
+class _Pending:
+    verb: str
+    prefix: str
+    future: asyncio.Future
+    # Loop time after which a timed-out request stops waiting for its late reply
+    expires: Optional[float] = None
+
+
+async def open_transport(url: str, baudrate: int = 115200) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Open a byte stream to a device.
+
+    :param url: "tcp://host:port" for a socket stand-in, otherwise a serial device or pty path.
+    :param baudrate: Only used when pyserial-asyncio opens the port (non-POSIX hosts).
+    """
+    if url.startswith("tcp://"):
+        host, port = url[len("tcp://"):].rsplit(":", 1)
+        return await asyncio.open_connection(host, int(port))
+
+    if os.name == "posix":
+        # USB CDC ignores the baud rate, so a raw tty works for real ports and ptys alike
+        return await _open_tty(url)
+
+    import serial_asyncio  # optional: pyserial-asyncio, needed for COM ports on Windows
+
+    return await serial_asyncio.open_serial_connection(url=url, baudrate=baudrate)
+
+
+async def _open_tty(path: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a tty or pty in raw mode using the event loop's pipe transports (Unix only)."""
+    import tty
+
+    loop = asyncio.get_running_loop()
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    tty.setraw(fd)
+
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0))
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(os.dup(fd), "wb", 0)
+    )
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+class PedalBoxClient:
+    """Typed async access to one pedal box."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name: str = "",
+                 telemetry_queue_size: int = 256, timeout: float = 2.0):
+        """
+        :param reader: Stream the device writes to.
+        :param writer: Stream commands are written to.
+        :param name: Label for this device (used by the aggregator).
+        :param telemetry_queue_size: Frames buffered per telemetry consumer; the oldest are dropped.
+        :param timeout: Seconds to wait for a command response.
+        """
+        self.name = name
+        self.timeout = timeout
+        self._reader = reader
+        self._writer = writer
+        self._pending: Deque[_Pending] = deque()
+        self._fields: Tuple[str, ...] = ()
+        self._telemetry_queue_size = telemetry_queue_size
+        self._subscribers: List[asyncio.Queue] = []
+        self._closed = asyncio.Event()
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def connect(cls, url: str, **kwargs) -> "PedalBoxClient":
+        """Open url (see :func:`open_transport`) and return a running client."""
+        reader, writer = await open_transport(url)
+        kwargs.setdefault("name", url)
+        return cls(reader, writer, **kwargs)
+
+    async def close(self) -> None:
+        self._read_task.cancel()
+        try:
+            await self._read_task
+        except asyncio.CancelledError:
+            pass
+        self._writer.close()
+        self._fail_pending(ConnectionError("client closed"))
+        self._closed.set()
+
+    async def __aenter__(self) -> "PedalBoxClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    ### Transport ###
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                raw = await self._reader.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", "replace").strip()
+                if not line:
+                    continue
+                if line.startswith(TELEMETRY_PREFIX):
+                    self._publish(self.parse_telemetry(line, self._fields))
+                else:
+                    self._resolve(line)
+        finally:
+            self._fail_pending(ConnectionError("device disconnected"))
+            for queue in self._subscribers:
+                queue.put_nowait(None)
+            self._closed.set()
+
+    @staticmethod
+    def _matches(pending: "_Pending", line: str) -> bool:
+        return line.startswith(pending.prefix) or line.startswith(f"ERR:{pending.verb}:")
+
+    def _resolve(self, line: str) -> None:
+        """Hand a response line to the oldest pending request that expects it; ignore anything else (debug output)."""
+        pending_queue = self._pending
+        # A timed-out request stays queued as a tombstone so its late reply is consumed here instead of being
+        # taken for the next request's. The device answers in order, so once a reply for a later request
+        # arrives, the tombstone's reply is never coming and it is dropped. A tombstone whose reply was lost
+        # and looks like the next one's (e.g. two "done") is dropped when it expires.
+        now = asyncio.get_running_loop().time()
+        while len(pending_queue) > 1 and pending_queue[0].future.done() and (
+                pending_queue[0].expires is not None and now >= pending_queue[0].expires
+                or not self._matches(pending_queue[0], line) and self._matches(pending_queue[1], line)):
+            pending_queue.popleft()
+        if not pending_queue:
+            return
+        pending = pending_queue[0]
+        if line.startswith(pending.prefix):
+            pending_queue.popleft()
+            if not pending.future.done():
+                pending.future.set_result(line[len(pending.prefix):])
+        elif line.startswith(f"ERR:{pending.verb}:"):
+            pending_queue.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(PedalBoxError(line[len(pending.verb) + 5:]))
+
+    def _fail_pending(self, error: Exception) -> None:
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(error)
+
+    async def request(self, line: str, prefix: str) -> str:
+        """
+        Send one command and wait for its response. Several requests may be in flight at once.
+
+        :param line: The command line without terminator, e.g. "GetMap".
+        :param prefix: The response prefix to wait for, e.g. "MAP:" or "done".
+        :return: The response with the prefix removed.
+        """
+        if self._closed.is_set():
+            raise ConnectionError("client closed")
+        verb = line.replace(" ", ":").split(":", 1)[0]
+        pending = _Pending(verb, prefix, asyncio.get_running_loop().create_future())
+        self._pending.append(pending)
+        self._writer.write(f"{line}\n".encode("utf-8"))
+        await self._writer.drain()
+        # On timeout the cancelled request stays queued for another timeout, so a late reply can't
+        # resolve a later request
+        try:
+            return await asyncio.wait_for(pending.future, self.timeout)
+        except asyncio.TimeoutError:
+            pending.expires = asyncio.get_running_loop().time() + self.timeout
+            raise
+
+    ### Queries ###
+    async def get_usage(self) -> Dict[str, bool]:
+        payload = await self.request("GetUsage", "USAGE:")
+        entries = (entry.split(":") for entry in payload.split(","))
+        return {name: value == "True" for name, value in entries}
+
+    async def get_map(self) -> Dict[str, List[int]]:
+        """Output maps keyed by pedal prefix."""
+        return self._parse_prefixed(await self.request("GetMap", "MAP:"), "MAP:")
+
+    async def get_calibration(self) -> Dict[str, List[int]]:
+        """Calibration values keyed by pedal prefix."""
+        return self._parse_prefixed(await self.request("GetCali", "CALI:"), "CALI:")
+
+    async def get_inverted(self) -> List[bool]:
+        return [value == "1" for value in (await self.request("GetInverted", "INVER:")).split("-")]
+
+    async def get_smooth(self) -> List[bool]:
+        return [value == "1" for value in (await self.request("GetSmooth", "SMOOTH:")).split("-")]
+
+    async def get_bits(self) -> List[Tuple[int, int]]:
+        """(raw full scale, HID full scale) per pedal."""
+        values = [int(value) for value in (await self.request("GetBits", "BITS:")).split("-")]
+        return list(zip(values[0::2], values[1::2]))
+
+    async def get_oversample(self) -> Dict[str, Tuple[int, str, float]]:
+        """(samples, mode, effective bits) keyed by pedal prefix."""
+        result = {}
+        for entry in (await self.request("GetOversample", "OVERSAMPLE:")).split(","):
+            prefix, samples, mode, bits = entry.split(":")
+            result[prefix] = (int(samples), mode, float(bits))
+        return result
+
+    async def get_rates(self) -> Dict[str, Tuple[int, int]]:
+        """(input samples/s, outputs/s) keyed by pedal prefix."""
+        result = {}
+        for entry in (await self.request("GetRates", "RATES:")).split(","):
+            prefix, sample_rate, output_rate = entry.split(":")
+            result[prefix] = (int(sample_rate), int(output_rate))
+        return result
+
+    async def get_i2c(self) -> Tuple[str, int, Dict[int, int]]:
+        """(recovery state, recoveries, failed transfers keyed by address); ("OFF", 0, {}) without a bus."""
+        payload = await self.request("GetI2C", "I2C:")
+        if payload == "OFF":
+            return "OFF", 0, {}
+        state, recoveries, errors = payload.split(":", 2)
+        counts = {}
+        for entry in filter(None, errors.split(",")):
+            address, count = entry.split("=")
+            counts[int(address, 16)] = int(count)
+        return state, int(recoveries), counts
+
+    async def get_all(self) -> Dict[str, dict]:
+        return json.loads(await self.request("GETALL", "ALL:"))
+
+    async def get_profiles(self) -> Tuple[Optional[str], List[str]]:
+        active, names = (await self.request("GetProfiles", "PROFILES:")).split(";", 1)
+        return active or None, [name for name in names.split(",") if name]
+
+    ### Updates ###
+    async def set_all(self, config: Dict[str, dict]) -> None:
+        await self.request("SETALL:" + json.dumps(config, separators=(",", ":")), DONE)
+
+    async def set_usage(self, pedal: str, on: bool) -> None:
+        await self.request(f"SetUsage:{pedal}:{int(on)}", DONE)
+
+    async def set_map(self, pedal: str, values: Sequence[int]) -> None:
+        await self.request(f"SetMap:{pedal}:{'-'.join(map(str, values))}", DONE)
+
+    async def set_calibration(self, pedal: str, values: Sequence[int]) -> None:
+        await self.request(f"SetCali:{pedal}:{'-'.join(map(str, values))}", DONE)
+
+    async def set_inverted(self, values: Sequence[bool]) -> None:
+        await self.request(f"SetInverted:{'-'.join(str(int(v)) for v in values)}", DONE)
+
+    async def set_smooth(self, values: Sequence[bool]) -> None:
+        await self.request(f"SetSmooth:{'-'.join(str(int(v)) for v in values)}", DONE)
+
+    async def set_bits(self, pedal: str, raw: str, hid: str) -> None:
+        await self.request(f"SetBits:{pedal}:{raw}:{hid}", DONE)
+
+    async def tare(self, pedal: str) -> None:
+        """Zero a load cell pedal; the offset is stored on the device."""
+        await self.request(f"TARE:{pedal}", DONE)
+
+    async def switch_profile(self, name: str) -> None:
+        await self.request(f"PROFILE:{name}", DONE)
+
+    ### Telemetry ###
+    async def stream(self, pedals: Sequence[str], fields: Sequence[str], decimation: int = 1) -> None:
+        """Subscribe to telemetry; pedals are names or prefixes, or ["all"]."""
+        self._fields = tuple(fields)
+        await self.request(f"STREAM:{','.join(pedals)}:{','.join(fields)}:{decimation}", DONE)
+
+    async def stop_stream(self) -> None:
+        await self.request("STREAM:OFF", DONE)
+
+    async def telemetry(self) -> AsyncIterator[TelemetryFrame]:
+        """Iterate over telemetry frames until the device disconnects."""
+        queue: asyncio.Queue = asyncio.Queue(self._telemetry_queue_size)
+        self._subscribers.append(queue)
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self._subscribers.remove(queue)
+
+    def _publish(self, frame: Optional[TelemetryFrame]) -> None:
+        if frame is None:
+            return
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # keep the freshest frames
+            queue.put_nowait(frame)
+
+    ### Parsing ###
+    @staticmethod
+    def parse_telemetry(line: str, fields: Sequence[str]) -> Optional[TelemetryFrame]:
+        """
+        Decode TEL:<seq>,<ms>;<prefix>=<v>,<v>;... using the subscribed field order.
+        Returns None for malformed lines.
+        """
+        try:
+            header, *pedals = line[len(TELEMETRY_PREFIX):].split(";")
+            sequence, device_ms = (int(value) for value in header.split(","))
+            frame = TelemetryFrame(sequence, device_ms, time.monotonic())
+            for entry in pedals:
+                prefix, values = entry.split("=", 1)
+                numbers = [int(value) for value in values.split(",")]
+                names = fields if len(fields) == len(numbers) else [str(i) for i in range(len(numbers))]
+                frame.values[prefix] = dict(zip(names, numbers))
+            return frame
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse_prefixed(payload: str, tag: str) -> Dict[str, List[int]]:
+        """Decode "TMAP:0-20-...,BMAP:..." style payloads into {prefix: values}."""
+        result = {}
+        for entry in payload.split(","):
+            key, values = entry.split(":", 1)
+            result[key[: -len(tag.rstrip(":"))]] = [int(value) for value in values.split("-")]
+        return result
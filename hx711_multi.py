@@ -0,0 +1,201 @@
+# hx711_multi.py
+
+import time
+
+# Clock pulses per conversion: 24 data bits plus 1 to select channel A at gain 128 for the next one
+PULSES_A_128 = 25
+PULSES_B_32 = 26
+PULSES_A_64 = 27
+# Longest wait for a conversion: the first one after power-up takes 400 ms at 10 samples/s
+READ_TIMEOUT_MS = 500
+
+# Groups by CLK pin name, so pedals configured one at a time find the clock they share
+_groups = {}
+
+
+class HX711Group:
+    """
+    Reads several HX711 converters wired to one shared CLK pin.
+    One sequence of 25-27 clock pulses shifts the next bit out of every DOUT at the same time,
+    so all conversions are read in the time a single HX711 would take.
+
+    HX711s on a shared clock convert in lockstep; a read waits until every DOUT is low (ready).
+    When a converter stays busy past the timeout (unplugged or stuck), the group is degraded and
+    reads return None without waiting until every DOUT is low again.
+    """
+
+    def __init__(self, clock_pin, pulses=PULSES_A_128, timeout_ms=READ_TIMEOUT_MS):
+        """
+        :param clock_pin: digitalio.DigitalInOut configured as output, shared by all HX711s.
+        :param pulses: Clock pulses per read (25, 26 or 27), selecting channel and gain of the next conversion.
+        :param timeout_ms: Longest wait for the HX711s to become ready.
+        """
+        self._clock_pin = clock_pin
+        self._data_pins = []
+        self._channels = []
+        self.pulses = pulses
+        self.values = []  # Last conversion of each channel, signed 24-bit
+        self.generation = 0  # Incremented by every read so channels can tell a fresh value from a stale one
+        self.degraded = False  # A converter timed out and has not been ready since
+        self._timeout_ns = timeout_ms * 1_000_000
+        self._clock_pin.value = False
+
+    @property
+    def is_ready(self):
+        """
+        True when every HX711 has a conversion waiting (all DOUT low).
+        """
+        for pin in self._data_pins:
+            if pin.value:
+                return False
+        return True
+
+    def add_channel(self, data_pin):
+        """
+        Add an HX711 by its DOUT pin.
+        :param data_pin: digitalio.DigitalInOut configured as input.
+        :return: An HX711Channel reading that converter.
+        """
+        channel = HX711Channel(self, len(self._data_pins), data_pin)
+        self._data_pins.append(data_pin)
+        self._channels.append(channel)
+        self.values.append(0)
+        return channel
+
+    def remove_channel(self, channel):
+        """
+        Remove a channel; the remaining channels are renumbered.
+        :return: True if the group has no channels left.
+        """
+        index = self._channels.index(channel)
+        del self._channels[index]
+        del self._data_pins[index]
+        del self.values[index]
+        for i, remaining in enumerate(self._channels):
+            remaining.index = i
+        return not self._channels
+
+    def read(self):
+        """
+        Wait for the HX711s to be ready, then clock one conversion out of all of them.
+        :return: The list of signed 24-bit values, one per channel (reused by the next read),
+                 or None when a converter did not become ready in time.
+        """
+        if not self.is_ready:
+            if self.degraded:
+                return None  # Don't wait again until the stuck converter recovers
+            deadline = time.monotonic_ns() + self._timeout_ns
+            while not self.is_ready:
+                if time.monotonic_ns() > deadline:
+                    self.degraded = True
+                    print("HX711 not ready, holding the last values")
+                    return None
+        self.degraded = False
+
+        clock = self._clock_pin
+        data_pins = self._data_pins
+        values = self.values
+        count = len(data_pins)
+        for i in range(count):
+            values[i] = 0
+
+        # Each pulse presents the next bit, MSB first, on every DOUT at once
+        for _ in range(24):
+            clock.value = True
+            clock.value = False
+            for i in range(count):
+                values[i] = (values[i] << 1) | data_pins[i].value
+
+        # Extra pulses select the channel and gain of the next conversion
+        for _ in range(self.pulses - 24):
+            clock.value = True
+            clock.value = False
+
+        for i in range(count):
+            if values[i] & 0x800000:
+                values[i] -= 0x1000000
+        self.generation += 1
+        return values
+
+    def deinit(self):
+        for pin in self._data_pins:
+            pin.deinit()
+        self._clock_pin.deinit()
+
+
+class HX711Channel:
+    """
+    One HX711 within a group. Reading a channel consumes the group's latest conversion, or clocks a new
+    one when this channel has already used it, so each conversion is clocked once for all pedals.
+    """
+
+    def __init__(self, group, index, data_pin):
+        self.group = group
+        self.index = index
+        self._data_pin = data_pin
+        self._generation = group.generation  # Nothing read yet
+        self.tare_value_a = 0
+
+    @property
+    def is_busy(self):
+        """
+        False when a value can be read without waiting.
+        """
+        return self._generation == self.group.generation and not self.group.is_ready
+
+    def read_raw(self):
+        """
+        :return: The signed conversion, or None when the group timed out.
+        """
+        group = self.group
+        if self._generation == group.generation and group.read() is None:
+            return None
+        self._generation = group.generation
+        return group.values[self.index]
+
+    def read(self):
+        """
+        :return: The tared conversion of this HX711, or None when the group timed out.
+        """
+        value = self.read_raw()
+        return None if value is None else value - self.tare_value_a
+
+    def release(self):
+        """
+        Detach from the group, releasing the pins when this was the last channel on the clock.
+        """
+        release_channel(self)
+
+
+def get_channel(data_pin_name, clock_pin_name, pulses=PULSES_A_128):
+    """
+    Return a channel for the HX711 on DOUT data_pin_name, creating the group for its CLK pin if needed.
+    :param data_pin_name: DOUT pin name from settings.json, e.g. "GP7".
+    :param clock_pin_name: CLK pin name, shared by every HX711 on the same clock.
+    """
+    import board
+    import digitalio
+
+    group = _groups.get(clock_pin_name)
+    if group is None:
+        clock_pin = digitalio.DigitalInOut(getattr(board, clock_pin_name))
+        clock_pin.direction = digitalio.Direction.OUTPUT
+        group = HX711Group(clock_pin, pulses)
+        _groups[clock_pin_name] = group
+
+    data_pin = digitalio.DigitalInOut(getattr(board, data_pin_name))
+    data_pin.direction = digitalio.Direction.INPUT
+    return group.add_channel(data_pin)
+
+
+def release_channel(channel):
+    """
+    Remove a channel from its group and release the pins that are no longer used.
+    """
+    channel._data_pin.deinit()
+    group = channel.group
+    if group.remove_channel(channel):
+        group._clock_pin.deinit()
+        for name, existing in list(_groups.items()):
+            if existing is group:
+                del _groups[name]
@@ -0,0 +1,187 @@
+# hx711_pio.py
+
+import array
+import time
+
+from hx711_multi import READ_TIMEOUT_MS
+
+try:
+    import rp2pio
+    import adafruit_pioasm
+except ImportError:
+    # Not on an RP2040, or the adafruit_pioasm library isn't installed
+    rp2pio = None
+    adafruit_pioasm = None
+
+# Waits for DOUT to go low, clocks 24 bits in MSB first, gives the 25th pulse (channel A,
+# gain 128 for the next conversion) and pushes the word. At 1 MHz CLK stays high for 4 us,
+# inside the HX711's 0.2-50 us window. "push noblock" keeps the machine converting when the
+# CPU falls behind; the CPU always drains the FIFO and keeps the newest word.
+HX711_PROGRAM = """
+.program hx711
+    set pins, 0
+.wrap_target
+    wait 0 pin 0
+    set x, 23
+bitloop:
+    set pins, 1 [3]
+    in pins, 1
+    set pins, 0 [2]
+    jmp x-- bitloop
+    set pins, 1 [3]
+    set pins, 0
+    push noblock
+.wrap
+"""
+
+PIO_FREQUENCY = 1_000_000
+# Entries in a state machine's RX FIFO
+FIFO_DEPTH = 4
+
+
+class EmulatedStateMachine:
+    """
+    Software stand-in for an rp2pio.StateMachine running HX711_PROGRAM, for use off-board.
+    Conversions are pushed explicitly with push(), or generated from source() at `rate` per second.
+    A full FIFO drops new words, like "push noblock".
+    """
+
+    def __init__(self, source=None, rate=80, depth=FIFO_DEPTH):
+        """
+        :param source: Optional callable returning the next 24-bit conversion.
+        :param rate: Conversions per second produced from source.
+        :param depth: FIFO entries.
+        """
+        self._fifo = []
+        self._depth = depth
+        self._source = source
+        self._period_ns = int(1_000_000_000 / rate)
+        self._next_ns = time.monotonic_ns() + self._period_ns
+        self.dropped = 0
+
+    def push(self, value):
+        if len(self._fifo) < self._depth:
+            self._fifo.append(value & 0xFFFFFF)
+        else:
+            self.dropped += 1
+
+    def _convert(self):
+        if self._source is None:
+            return
+        now = time.monotonic_ns()
+        while self._next_ns <= now:
+            self.push(self._source())
+            self._next_ns += self._period_ns
+
+    @property
+    def in_waiting(self):
+        self._convert()
+        return len(self._fifo)
+
+    def readinto(self, buffer, timeout_ms=READ_TIMEOUT_MS):
+        """
+        Fill buffer from the FIFO, waiting at most timeout_ms for conversions (returning at once
+        without a source).
+        :return: The number of words read.
+        """
+        deadline = time.monotonic_ns() + timeout_ms * 1_000_000
+        for i in range(len(buffer)):
+            while not self._fifo:
+                if self._source is None or time.monotonic_ns() > deadline:
+                    return i
+                self._convert()
+            buffer[i] = self._fifo.pop(0)
+        return len(buffer)
+
+    def deinit(self):
+        self._fifo = []
+
+
+class HX711PIO:
+    """
+    HX711 read by a PIO state machine: the clocking runs entirely in PIO and the CPU only drains
+    24-bit words from the RX FIFO. Same interface as hx711_multi.HX711Channel, including the
+    timeout: when no conversion arrives in time, reads return None.
+    """
+
+    def __init__(self, state_machine, timeout_ms=READ_TIMEOUT_MS):
+        """
+        :param state_machine: An rp2pio.StateMachine running HX711_PROGRAM, or an EmulatedStateMachine.
+        :param timeout_ms: Longest wait for a conversion.
+        """
+        self._state_machine = state_machine
+        self._timeout_ns = timeout_ms * 1_000_000
+        self.degraded = False
+        self._word = array.array("L", [0])
+        self._latest = 0
+        self._fresh = False
+        self.tare_value_a = 0
+
+    def _drain(self):
+        """
+        Move everything out of the FIFO, keeping the newest conversion.
+        """
+        state_machine = self._state_machine
+        while state_machine.in_waiting:
+            state_machine.readinto(self._word)
+            value = self._word[0] & 0xFFFFFF
+            self._latest = value - 0x1000000 if value & 0x800000 else value
+            self._fresh = True
+
+    @property
+    def is_busy(self):
+        """
+        False when a conversion is waiting.
+        """
+        self._drain()
+        return not self._fresh
+
+    def read_raw(self):
+        """
+        Return the newest conversion, waiting for one if it was already read.
+        :return: The signed conversion, or None when none arrived in time.
+        """
+        self._drain()
+        if not self._fresh:
+            if self.degraded:
+                return None  # Don't wait again until the HX711 delivers
+            deadline = time.monotonic_ns() + self._timeout_ns
+            while not self._fresh:
+                if time.monotonic_ns() > deadline:
+                    self.degraded = True
+                    print("HX711 not ready, holding the last value")
+                    return None
+                self._drain()
+        self.degraded = False
+        self._fresh = False
+        return self._latest
+
+    def read(self):
+        """
+        :return: The tared newest conversion, or None when none arrived in time.
+        """
+        value = self.read_raw()
+        return None if value is None else value - self.tare_value_a
+
+    def release(self):
+        self._state_machine.deinit()
+
+
+def create(data_pin_name, clock_pin_name):
+    """
+    Start a state machine reading the HX711 on the given pins.
+    :raises ImportError: If rp2pio or adafruit_pioasm is unavailable.
+    """
+    if rp2pio is None:
+        raise ImportError("PIO HX711 needs rp2pio and adafruit_pioasm")
+    import board
+
+    state_machine = rp2pio.StateMachine(
+        adafruit_pioasm.assemble(HX711_PROGRAM),
+        frequency=PIO_FREQUENCY,
+        first_set_pin=getattr(board, clock_pin_name),
+        first_in_pin=getattr(board, data_pin_name),
+        in_shift_right=False,
+        auto_push=False,
+    )
+    return HX711PIO(state_machine)
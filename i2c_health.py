@@ -0,0 +1,159 @@
+# i2c_health.py
+
+import time
+
+# Recovery states
+OK = "ok"
+RELEASE = "release"
+CLOCK = "clock"
+STOP = "stop"
+REINIT = "reinit"
+BACKOFF = "backoff"
+
+# A stuck slave releases SDA within 9 clocks (at most 8 data bits plus the ACK)
+RECOVERY_PULSES = 9
+
+
+class I2CHealth:
+    """
+    Watches the I2C bus for failing devices and frees a stuck bus without stopping the loop.
+
+    Devices report every failed and successful transfer. After `threshold` consecutive failures
+    on any device the bus is recovered: busio.I2C is released, SCL is clocked up to 9 times until
+    the slave lets go of SDA, a STOP condition is sent and busio.I2C is created again.
+    poll() advances the recovery by one short step per call, so the other pedals keep sampling
+    and reporting in between. While recovering, I2C devices are unavailable and their pedals hold
+    their last value.
+    """
+
+    def __init__(self, i2c, scl_pin, sda_pin, frequency, threshold=3, backoff_ms=500):
+        """
+        :param i2c: The busio.I2C in use.
+        :param scl_pin: Board pin used as SCL.
+        :param sda_pin: Board pin used as SDA.
+        :param frequency: Bus clock to recreate busio.I2C with.
+        :param threshold: Consecutive failures of one device that trigger a recovery.
+        :param backoff_ms: Wait before recovering again, or retrying when the bus can't be recreated.
+        """
+        self.i2c = i2c
+        self._scl_pin = scl_pin
+        self._sda_pin = sda_pin
+        self._frequency = frequency
+        self.threshold = threshold
+        self._backoff_ns = backoff_ms * 1_000_000
+        self.state = OK
+        self.recoveries = 0
+        self.errors = {}  # address -> failed transfers since boot
+        self._consecutive = {}  # address -> failed transfers since the last success
+        self._listeners = []
+        self._scl = None
+        self._sda = None
+        self._pulses = 0
+        self._retry_at = 0
+
+    @property
+    def ready(self):
+        """True while the bus can be used."""
+        return self.state == OK
+
+    def add_listener(self, callback):
+        """
+        Call callback(i2c) with the new bus object after every recovery.
+        """
+        self._listeners.append(callback)
+
+    def record_success(self, address):
+        self._consecutive[address] = 0
+
+    def record_error(self, address, error):
+        """
+        Count a failed transfer and start a recovery once a device keeps failing.
+        """
+        self.errors[address] = self.errors.get(address, 0) + 1
+        count = self._consecutive.get(address, 0) + 1
+        self._consecutive[address] = count
+        if count == 1:
+            print(f"I2C error at {hex(address)}: {error}")
+        if count >= self.threshold and self.state == OK and time.monotonic_ns() >= self._retry_at:
+            print(f"I2C device {hex(address)} keeps failing, recovering the bus")
+            self.state = RELEASE
+
+    def poll(self):
+        """
+        Advance a running recovery by one step. Does nothing while the bus is healthy.
+        """
+        state = self.state
+        if state == OK:
+            return
+        if state == RELEASE:
+            self._release()
+        elif state == CLOCK:
+            self._clock()
+        elif state == STOP:
+            self._stop()
+        elif state == REINIT:
+            self._reinit()
+        elif state == BACKOFF and time.monotonic_ns() >= self._retry_at:
+            self.state = RELEASE
+
+    def _release(self):
+        import digitalio
+
+        try:
+            self.i2c.deinit()
+        except Exception:
+            pass
+        self._scl = digitalio.DigitalInOut(self._scl_pin)
+        self._scl.switch_to_output(value=True, drive_mode=digitalio.DriveMode.OPEN_DRAIN)
+        self._sda = digitalio.DigitalInOut(self._sda_pin)
+        self._sda.switch_to_input(pull=digitalio.Pull.UP)
+        self._pulses = 0
+        self.state = CLOCK
+
+    def _clock(self):
+        # One clock pulse per step; done as soon as the slave releases SDA
+        if self._sda.value or self._pulses >= RECOVERY_PULSES:
+            self.state = STOP
+            return
+        self._scl.value = False
+        self._scl.value = True
+        self._pulses += 1
+
+    def _stop(self):
+        import digitalio
+
+        # STOP: SDA rises while SCL is high
+        self._sda.switch_to_output(value=False, drive_mode=digitalio.DriveMode.OPEN_DRAIN)
+        self._scl.value = True
+        self._sda.value = True
+        self._scl.deinit()
+        self._sda.deinit()
+        self._scl = self._sda = None
+        self.state = REINIT
+
+    def _reinit(self):
+        import busio
+
+        try:
+            self.i2c = busio.I2C(self._scl_pin, self._sda_pin, frequency=self._frequency)
+        except (RuntimeError, ValueError) as e:
+            # e.g. SDA still held low: no pull-up found
+            print(f"I2C recovery failed: {e}")
+            self._retry_at = time.monotonic_ns() + self._backoff_ns
+            self.state = BACKOFF
+            return
+        self._consecutive = {}
+        self.recoveries += 1
+        self.state = OK
+        # A device that is gone for good must not keep the bus in recovery
+        self._retry_at = time.monotonic_ns() + self._backoff_ns
+        for callback in self._listeners:
+            callback(self.i2c)
+        print(f"I2C bus recovered ({self.recoveries} recoveries)")
+
+    def report(self):
+        """
+        Describe the bus in the format I2C:<state>:<recoveries>:<address>=<errors>,...
+        """
+        errors = ",".join(f"{hex(address)}={count}" for address, count in sorted(self.errors.items()))
+        return f"I2C:{self.state}:{self.recoveries}:{errors}"
@@ -0,0 +1,313 @@
+# input_backends.py
+#
+# Every pedal input implements the same small protocol, so Pedal picks a backend once when it is
+# configured and its hot path is a single read_into() call:
+#
+#   input_type        "Analog", "Loadcell", "ADS" or "Simulated"
+#   bits              Resolution of the samples written by read_into()
+#   nominal_rate      Samples per second the input can deliver
+#   buffer            Preallocated sample buffer sized for one read
+#   start()           Prepare the input for sampling
+#   ready()           True when read_into() can return without waiting
+#   read_into(buffer) Fill buffer with samples at the input's resolution; returns how many were written,
+#                     0 when nothing could be read (the pedal then holds its last value)
+#   scale(value)      Convert a (decimated) sample to the pedal's raw bit depth
+#   set_bits(bits)    Follow a change of the pedal's raw bit depth
+#   deinit()          Release the hardware
+#   degraded          True while the input fails and the pedal holds its last value
+
+import array
+import time
+
+# The RP2040 ADC converts 12 bits; analogio scales its readings up to 16 bits
+ADC_BITS = 12
+ANALOGIO_BITS = 16
+# Conversions per second of the RP2040 ADC
+ADC_RATE = 500_000
+# 24-bit two's complement HX711 conversions, clamped to the positive range
+HX711_BITS = 24
+HX711_MAX = (1 << HX711_BITS) - 1
+
+
+def _board_pin(pin):
+    """
+    Accept either a board pin object or a pin name from settings.json ("GP26").
+    """
+    if isinstance(pin, str):
+        import board
+        return getattr(board, pin)
+    return pin
+
+
+class AnalogInput:
+    """
+    On-chip ADC input read one sample at a time through analogio.AnalogIn.
+    Readings are returned at ADC resolution, so the oversampling stage averages real conversions;
+    scale() converts the result to the pedal's raw bit depth.
+    """
+
+    input_type = "Analog"
+    bits = ADC_BITS
+    nominal_rate = ADC_RATE
+    degraded = False
+
+    def __init__(self, pin, bits, analogio=None):
+        """
+        :param pin: Board pin or pin name of an ADC-capable pin (GP26-GP29).
+        :param bits: The raw bit depth the pedal is configured for, e.g. 10 for "10bit".
+        :param analogio: Module providing AnalogIn; defaults to the CircuitPython module (injectable for tests).
+        """
+        if analogio is None:
+            import analogio
+        self._input = analogio.AnalogIn(_board_pin(pin))
+        self.buffer = array.array("l", [0])
+        self.set_bits(bits)
+
+    def set_bits(self, bits):
+        self._scale = 2 ** (bits - ADC_BITS)
+
+    def start(self):
+        pass
+
+    def ready(self):
+        return True
+
+    def read_into(self, buffer):
+        # analogio pads the 12-bit conversion to 16 bits
+        buffer[0] = self._input.value >> (ANALOGIO_BITS - ADC_BITS)
+        return 1
+
+    def scale(self, value):
+        return value * self._scale
+
+    def deinit(self):
+        self._input.deinit()
+
+
+class BurstAnalogInput:
+    """
+    On-chip ADC input sampled in bursts: analogbufio.BufferedIn fills a preallocated buffer by DMA
+    at a fixed sample rate, and the whole block goes to the decimation stage. This gives thousands
+    of samples per second for the cost of one call per loop.
+    Only one BufferedIn can use the ADC at a time.
+    """
+
+    input_type = "Analog"
+    bits = ADC_BITS
+    degraded = False
+
+    def __init__(self, pin, bits, samples=64, rate=100000, analogbufio=None):
+        """
+        :param pin: Board pin or pin name of an ADC-capable pin (GP26-GP29).
+        :param bits: The raw bit depth the pedal is configured for.
+        :param samples: Samples per burst.
+        :param rate: ADC sample rate in Hz during a burst.
+        :param analogbufio: Module providing BufferedIn (injectable for tests).
+        """
+        if analogbufio is None:
+            import analogbufio
+        self._input = analogbufio.BufferedIn(_board_pin(pin), sample_rate=rate)
+        self.buffer = array.array("H", [0] * samples)
+        self.nominal_rate = rate
+        self.set_bits(bits)
+
+    def set_bits(self, bits):
+        # Blocks are decimated at ADC resolution and only the result is scaled
+        self._scale = 2 ** (bits - ADC_BITS)
+
+    def start(self):
+        pass
+
+    def ready(self):
+        return True
+
+    def read_into(self, buffer):
+        """
+        Fill buffer with one burst of ADC readings.
+        """
+        self._input.readinto(buffer)
+        return len(buffer)
+
+    def scale(self, value):
+        """
+        Convert a (decimated) ADC value to the pedal's raw bit depth.
+        """
+        return value * self._scale
+
+    def deinit(self):
+        self._input.deinit()
+
+
+class LoadCellInput:
+    """
+    HX711 load cell, read through an hx711_multi.HX711Channel or an hx711_pio.HX711PIO.
+    start() restores the stored tare offset, or tares the cell with a few unloaded readings when
+    none is stored; it runs during setup, before USB is ready, so it does not delay the first HID
+    report. A converter that stops responding leaves the pedal degraded, holding its last value.
+    """
+
+    input_type = "Loadcell"
+    bits = HX711_BITS
+
+    def __init__(self, channel, tare_samples=10, rate=80, tare=None):
+        """
+        :param channel: The HX711 channel.
+        :param tare_samples: Readings averaged by the tare.
+        :param rate: Conversions per second selected with the HX711 RATE pin (10 or 80).
+        :param tare: Stored tare offset to use instead of taring again, or None.
+        """
+        self.channel = channel
+        self.tare_samples = tare_samples
+        self.tare_value = tare
+        self.nominal_rate = rate
+        self.buffer = array.array("l", [0])
+        self.degraded = False
+
+    def set_bits(self, bits):
+        pass
+
+    def start(self):
+        if self.tare_value is None:
+            self.tare(self.tare_samples)
+        else:
+            self.channel.tare_value_a = self.tare_value
+
+    def tare(self, samples=10):
+        """
+        Zero the load cell by averaging a few unloaded readings.
+        :return: The new tare offset, or None if the converter did not respond.
+        """
+        channel = self.channel
+        channel.tare_value_a = 0
+        total = 0
+        count = 0
+        for _ in range(samples):
+            value = channel.read()
+            if value is None:
+                break  # Not responding; keep the tare at zero
+            total += value
+            count += 1
+        if count:
+            channel.tare_value_a = total // count
+        self.tare_value = channel.tare_value_a if count else None
+        return self.tare_value
+
+    def ready(self):
+        # The HX711 holds DOUT high while it converts
+        return not self.channel.is_busy
+
+    def read_into(self, buffer):
+        value = self.channel.read()
+        if value is None:
+            self.degraded = True
+            return 0
+        self.degraded = False
+        buffer[0] = max(min(value, HX711_MAX), 0)
+        return 1
+
+    def scale(self, value):
+        return value
+
+    def deinit(self):
+        self.channel.release()
+
+
+class ADSInput:
+    """
+    Single-ended input of a shared ads_devices.ADSDevice. A failed transfer leaves the pedal
+    degraded: read_into() returns 0 and the pedal holds its last value until the device or the
+    bus recovers.
+    """
+
+    input_type = "ADS"
+
+    def __init__(self, device, channel):
+        """
+        :param device: The ads_devices.ADSDevice the input is wired to.
+        :param channel: The input (0-3).
+        """
+        self.device = device
+        self.channel = channel
+        self.bits = getattr(device.ads, "bits", 16)
+        self.buffer = array.array("l", [0])
+        self.degraded = False
+
+    @property
+    def nominal_rate(self):
+        # Channels converted in turn share the device's data rate
+        return self.device.ads.data_rate / max(len(self.device.sequence), 1)
+
+    def set_bits(self, bits):
+        pass
+
+    def start(self):
+        self.device.add_channel(self.channel)
+
+    def ready(self):
+        # A device converting several channels may be busy with another pedal's conversion
+        return self.device.ready(self.channel)
+
+    def read_into(self, buffer):
+        try:
+            value = self.device.read(self.channel)
+        except OSError:
+            self.degraded = True
+            return 0
+        self.degraded = False
+        buffer[0] = max(value, 0)
+        return 1
+
+    def scale(self, value):
+        return value
+
+    def deinit(self):
+        from ads_devices import release_channel
+
+        release_channel(self.device, self.channel)
+
+
+class SimulatedInput:
+    """
+    Input without hardware for host testing: every sample comes from source(), and ready()
+    paces the samples at `rate` per second.
+    Use it with Pedal.use_backend(SimulatedInput(...)).
+    """
+
+    input_type = "Simulated"
+    degraded = False
+
+    def __init__(self, source, bits=16, rate=1000, samples=1):
+        """
+        :param source: Callable returning the next sample as an int at the pedal's raw bit depth.
+        :param bits: Resolution of the samples.
+        :param rate: Samples per second.
+        :param samples: Samples per read; more than one produces blocks like BurstAnalogInput.
+        """
+        self._source = source
+        self.bits = bits
+        self.nominal_rate = rate
+        self.buffer = array.array("l", [0] * samples)
+        self._period_ns = int(1_000_000_000 / rate)
+        self._next_ns = 0
+
+    def set_bits(self, bits):
+        self.bits = bits
+
+    def start(self):
+        self._next_ns = time.monotonic_ns()
+
+    def ready(self):
+        return time.monotonic_ns() >= self._next_ns
+
+    def read_into(self, buffer):
+        source = self._source
+        for i in range(len(buffer)):
+            buffer[i] = source()
+        self._next_ns = time.monotonic_ns() + self._period_ns * len(buffer)
+        return len(buffer)
+
+    def scale(self, value):
+        return value
+
+    def deinit(self):
+        pass
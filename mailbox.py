@@ -0,0 +1,48 @@
+# mailbox.py
+
+import time
+
+
+class Mailbox:
+    """
+    Latest-value slots shared between the pedal samplers and the HID reporter.
+
+    Each sampler overwrites its slot with its newest processed value and the time it was taken;
+    the reporter reads whatever is freshest when the host polls. Neither side waits for the other,
+    so a fast analog pedal is not held back by an 80 SPS load cell and vice versa.
+    """
+
+    def __init__(self, names):
+        """
+        :param names: The slot names, e.g. the pedal names, in report order.
+        """
+        self.slots = {name: index for index, name in enumerate(names)}
+        self.values = [0] * len(names)
+        self.stamps = [0] * len(names)  # time.monotonic_ns() of the last publish, 0 if never
+        self.version = 0  # Incremented on every publish so readers can skip unchanged data
+
+    def publish(self, slot, value, stamp=None):
+        """
+        Replace the value in a slot.
+        :param slot: The slot index (see slots).
+        :param value: The new value.
+        :param stamp: When the value was sampled; defaults to now.
+        """
+        self.values[slot] = value
+        self.stamps[slot] = time.monotonic_ns() if stamp is None else stamp
+        self.version += 1
+
+    def read(self, slot):
+        """
+        :return: (value, stamp) of a slot.
+        """
+        return self.values[slot], self.stamps[slot]
+
+    def age_ms(self, slot, now=None):
+        """
+        How long ago a slot was last published, in milliseconds, or None if it never was.
+        """
+        stamp = self.stamps[slot]
+        if not stamp:
+            return None
+        return ((time.monotonic_ns() if now is None else now) - stamp) // 1_000_000
@@ -0,0 +1,65 @@
+# pedal_registry.py
+
+import json
+
+# HID Generic Desktop usages a pedal can be reported on
+AXIS_USAGES = {
+    "x": 0x30,
+    "y": 0x31,
+    "z": 0x32,
+    "rx": 0x33,
+    "ry": 0x34,
+    "rz": 0x35,
+    "slider": 0x36,
+    "dial": 0x37,
+    "wheel": 0x38,
+}
+
+# Used when settings.json has no "pedals" list
+DEFAULT_PEDALS = [
+    {"name": "throttle", "prefix": "T", "axis": "rx"},
+    {"name": "brake", "prefix": "B", "axis": "ry"},
+    {"name": "clutch", "prefix": "C", "axis": "rz"},
+]
+
+
+def pedal_list(settings):
+    """
+    Read the pedal registry from settings: "pedals": [{"name": "handbrake", "prefix": "H", "axis": "slider"}, ...].
+    The order of the list is the order of the axes in the HID report. Each pedal's configuration
+    lives under its name, like the default throttle/brake/clutch sections.
+    :param settings: The settings dictionary.
+    :return: List of (name, prefix, axis) tuples.
+    :raises ValueError: If an entry is incomplete or a name, prefix or axis is used twice.
+    """
+    entries = (settings or {}).get("pedals") or DEFAULT_PEDALS
+    pedals = []
+    seen = set()
+    for entry in entries:
+        name = entry.get("name")
+        prefix = entry.get("prefix")
+        axis = entry.get("axis")
+        if not name or not prefix:
+            raise ValueError(f"Pedal entry needs a name and a prefix: {entry}")
+        if axis not in AXIS_USAGES:
+            raise ValueError(f"Invalid axis {axis} for {name}, expected one of {list(AXIS_USAGES)}")
+        for key in (name, prefix, axis):
+            if key in seen:
+                raise ValueError(f"Pedal name, prefix or axis {key} is used twice")
+            seen.add(key)
+        pedals.append((name, prefix, axis))
+    return pedals
+
+
+def read_axes(path="settings.json"):
+    """
+    Read the HID axes of the configured pedals straight from the settings file, for boot.py,
+    which runs before the storage helper exists. Falls back to the default pedals.
+    """
+    try:
+        with open(path, "r") as file:
+            settings = json.load(file)
+        return [axis for name, prefix, axis in pedal_list(settings)]
+    except (OSError, ValueError) as e:
+        print(f"Using the default pedal axes: {e}")
+        return [axis for name, prefix, axis in pedal_list(None)]
@@ -0,0 +1,66 @@
+# rate_tuning.py
+
+# Sample rate the pedals should reach when nothing is configured: one sample per 1 ms HID report
+DEFAULT_TARGET_RATE = 1000
+# HX711 output rates selectable with its RATE pin
+HX711_RATES = (10, 80)
+DEFAULT_HX711_RATE = 80
+# +/-6.144 V input range, so a pot on the 3.3 V rail never clips
+DEFAULT_ADS_GAIN = 2 / 3
+
+
+def plan_ads(rates, channel_count, target_rate):
+    """
+    Choose the data rate and conversion mode for an ADS1x15 with channel_count pedals.
+    One channel runs continuously; several are converted in turn in single-shot mode, so the
+    data rate has to cover every channel. The slowest rate that reaches the target is chosen
+    (slower conversions are less noisy), or the fastest rate when none does.
+    :param rates: The driver's valid data rates (ads.rates).
+    :param channel_count: Channels converted on this device.
+    :param target_rate: Wanted samples per second per channel.
+    :return: (data_rate, mode, per-channel samples per second)
+    """
+    from ads_devices import MODE_CONTINUOUS, MODE_SINGLE
+
+    rates = sorted(rates)
+    needed = target_rate * channel_count
+    data_rate = rates[-1]
+    for rate in rates:
+        if rate >= needed:
+            data_rate = rate
+            break
+    mode = MODE_CONTINUOUS if channel_count == 1 else MODE_SINGLE
+    return data_rate, mode, data_rate / channel_count
+
+
+def validate_gain(gains, gain):
+    """
+    Match a configured gain against the driver's gains, tolerating rounding (0.667 for 2/3).
+    :raises ValueError: If the driver does not support the gain.
+    """
+    for valid in gains:
+        if abs(valid - gain) < 0.001:
+            return valid
+    raise ValueError(f"ADS gain must be one of {gains}")
+
+
+def input_rate(input_config, target_rate, ads_rate=None):
+    """
+    Nominal samples per second a pedal's input delivers.
+    :param input_config: The pedal's "input" settings section.
+    :param target_rate: The loop/report rate the pedals are sampled at.
+    :param ads_rate: Per-channel rate of the pedal's ADS device, for ADS inputs.
+    """
+    input_type = input_config.get("type")
+    if input_type == "Loadcell":
+        rate = input_config.get("rate", DEFAULT_HX711_RATE)
+        if rate not in HX711_RATES:
+            raise ValueError(f"HX711 rate must be one of {HX711_RATES}")
+        return min(rate, target_rate)
+    if input_type == "ADS":
+        return min(ads_rate or 0, target_rate)
+    burst = input_config.get("burst")
+    if burst:
+        # One burst per pass, limited by how fast the ADC fills it
+        return min(burst.get("samples", 64) * target_rate, burst.get("rate", 100000))
+    return target_rate
@@ -0,0 +1,143 @@
+# record_store.py
+
+import struct
+
+try:
+    from binascii import crc32
+except ImportError:
+    from zlib import crc32
+
+# Record layout: sequence number, key tag, value count, up to 6 signed values, then a CRC32 of all of it
+_RECORD_FORMAT = "<IHB6i"
+_RECORD_BODY_SIZE = struct.calcsize(_RECORD_FORMAT)
+RECORD_SIZE = _RECORD_BODY_SIZE + 4
+MAX_VALUES = 6
+
+
+def key_tag(key):
+    """
+    Derive the 16-bit tag stored in a record from its key (e.g. "brake.calibration").
+    """
+    return crc32(key.encode("utf-8")) & 0xFFFF
+
+
+class RecordStore:
+    """
+    Small fixed-size records written round-robin into a preallocated file.
+    Every write touches one slot instead of rewriting a whole document, and the newest record
+    with a valid checksum wins when the store is scanned at boot.
+    """
+
+    def __init__(self, file_path="records.bin", slots=64):
+        """
+        :param file_path: The path of the preallocated record file.
+        :param slots: The number of records in the ring. Must be well above the number of distinct keys.
+        """
+        self.file_path = file_path
+        self.slots = slots
+        self._buf = bytearray(RECORD_SIZE)
+        self._slot_tags = [None] * slots
+        self._latest = {}  # tag -> [sequence, slot, values]
+        self._sequence = 0
+        self._next_slot = 0
+        self._scan()
+
+    def _scan(self):
+        """
+        Read every slot, keep the newest valid record per tag and find where the ring continues.
+        Creates the file if it is missing or has the wrong size.
+        """
+        try:
+            with open(self.file_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = b""
+
+        if len(data) != self.slots * RECORD_SIZE:
+            self._preallocate()
+            return
+
+        newest_slot = -1
+        for slot in range(self.slots):
+            record = self._decode(data, slot * RECORD_SIZE)
+            if record is None:
+                continue
+            sequence, tag, values = record
+            self._slot_tags[slot] = tag
+            latest = self._latest.get(tag)
+            if latest is None or sequence > latest[0]:
+                self._latest[tag] = [sequence, slot, values]
+            if sequence >= self._sequence:
+                self._sequence = sequence
+                newest_slot = slot
+        self._next_slot = (newest_slot + 1) % self.slots
+
+    def _preallocate(self):
+        try:
+            with open(self.file_path, "wb") as f:
+                f.write(bytes(self.slots * RECORD_SIZE))
+        except OSError as e:
+            print(f"Error preallocating record file: {e}")
+
+    def clear(self):
+        """
+        Erase every record, e.g. when settings are reset to defaults.
+        """
+        self._slot_tags = [None] * self.slots
+        self._latest = {}
+        self._sequence = 0
+        self._next_slot = 0
+        self._preallocate()
+
+    @staticmethod
+    def _decode(data, offset):
+        body = data[offset:offset + _RECORD_BODY_SIZE]
+        (checksum,) = struct.unpack_from("<I", data, offset + _RECORD_BODY_SIZE)
+        if crc32(body) != checksum:
+            return None
+        fields = struct.unpack(_RECORD_FORMAT, body)
+        count = min(fields[2], MAX_VALUES)
+        return fields[0], fields[1], list(fields[3:3 + count])
+
+    def read(self, key):
+        """
+        Return the newest values stored for key, or None if there is no valid record.
+        """
+        latest = self._latest.get(key_tag(key))
+        return list(latest[2]) if latest else None
+
+    def write(self, key, values):
+        """
+        Append a record for key into the next slot of the ring.
+        If the slot being reused holds the only live copy of another key, that record is carried forward.
+        :param key: The record key (e.g. "brake.calibration").
+        :param values: Up to 6 integers.
+        """
+        if len(values) > MAX_VALUES:
+            raise ValueError(f"A record holds at most {MAX_VALUES} values")
+        pending = [(key_tag(key), [int(v) for v in values])]
+        while pending:
+            tag, record_values = pending.pop()
+            slot = self._next_slot
+            displaced = self._slot_tags[slot]
+            if displaced is not None and displaced != tag:
+                latest = self._latest.get(displaced)
+                if latest and latest[1] == slot:
+                    pending.append((displaced, latest[2]))
+            self._write_slot(slot, tag, record_values)
+
+    def _write_slot(self, slot, tag, values):
+        self._sequence += 1
+        padded = values + [0] * (MAX_VALUES - len(values))
+        struct.pack_into(_RECORD_FORMAT, self._buf, 0, self._sequence, tag, len(values), *padded)
+        struct.pack_into("<I", self._buf, _RECORD_BODY_SIZE, crc32(memoryview(self._buf)[:_RECORD_BODY_SIZE]))
+        try:
+            with open(self.file_path, "r+b") as f:
+                f.seek(slot * RECORD_SIZE)
+                f.write(self._buf)
+        except OSError as e:
+            print(f"Error writing record: {e}")
+            return
+        self._slot_tags[slot] = tag
+        self._latest[tag] = [self._sequence, slot, values]
+        self._next_slot = (slot + 1) % self.slots
@@ -0,0 +1,87 @@
+# serial_commands.py
+
+
+class CommandError(ValueError):
+    """Raised by a command handler to send an ERR response back to the host."""
+
+
+class CommandDispatcher:
+    """
+    Tokenizes a serial command line once and dispatches it through a dictionary.
+
+    Lines have the form VERB[:ARG[:ARG...]] (spaces are accepted as separators too), e.g.
+    "GetMap", "SetMap:throttle:0-20-40-60-80-100" or "INVER:0-1-0".
+    Handlers receive the argument list and return the response line (without newline), pre-encoded
+    bytes (with newline) or None.
+    Failures are answered with ERR:<verb>:<reason>.
+    """
+
+    def __init__(self, write):
+        """
+        :param write: Callable taking the encoded response bytes, e.g. usb_cdc.console.write.
+        """
+        self._write = write
+        self._commands = {}  # verb -> (handler, min_args, max_args, raw)
+
+    def register(self, verb, handler, min_args=0, max_args=None, raw=False):
+        """
+        Register a command.
+        :param verb: The command name, matched exactly (case-sensitive).
+        :param handler: Callable taking the argument list.
+        :param min_args: Minimum number of arguments.
+        :param max_args: Maximum number of arguments (defaults to min_args).
+        :param raw: Pass everything after the verb as a single untokenized argument (e.g. a JSON payload).
+        """
+        self._commands[verb] = (handler, min_args, min_args if max_args is None else max_args, raw)
+
+    @staticmethod
+    def tokenize(line):
+        """
+        Split a command line into its verb and arguments.
+        :return: (verb, args), verb is "" for an empty line.
+        """
+        tokens = [token for token in line.strip().replace(" ", ":").split(":") if token]
+        if not tokens:
+            return "", []
+        return tokens[0], tokens[1:]
+
+    def dispatch(self, line):
+        """
+        Execute one command line and write its response.
+        :return: True if a registered command ran successfully.
+        """
+        verb, args = self.tokenize(line)
+        if not verb:
+            return False
+        command = self._commands.get(verb)
+        if command is None:
+            self.respond(f"ERR:{verb}:unknown command")
+            return False
+
+        handler, min_args, max_args, raw = command
+        if raw:
+            payload = line.strip()[len(verb):].lstrip(": ")
+            args = [payload] if payload else []
+        if not min_args <= len(args) <= max_args:
+            expected = min_args if min_args == max_args else f"{min_args}-{max_args}"
+            self.respond(f"ERR:{verb}:expected {expected} arguments")
+            return False
+
+        try:
+            response = handler(args)
+        except Exception as e:
+            # Every failure gets an answer, so a host waiting for the response never times out
+            self.respond(f"ERR:{verb}:{e}")
+            return False
+        if response is not None:
+            self.respond(response)
+        return True
+
+    def respond(self, response):
+        """
+        Write a response line. Bytes are taken as already encoded, including the newline.
+        """
+        if isinstance(response, bytes):
+            self._write(response)
+        else:
+            self._write(f"{response}\n".encode("utf-8"))
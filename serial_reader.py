@@ -0,0 +1,100 @@
+# serial_reader.py
+
+import time
+
+
+class SerialLineReader:
+    """
+    Non-blocking line reader over a usb_cdc serial port.
+    Bytes are accumulated into a preallocated buffer; complete lines are handed to a callback
+    while a per-call time budget lasts, so configuration traffic never starves sampling.
+    """
+
+    def __init__(self, stream, on_line, buffer_size=1024, budget_ms=2, on_overflow=None):
+        """
+        :param stream: The serial port (usb_cdc.data or usb_cdc.console).
+        :param on_line: Callable taking one decoded line without its terminator.
+        :param buffer_size: Maximum line length; longer lines are discarded.
+        :param budget_ms: Maximum time spent executing lines per poll.
+        :param on_overflow: Callable taking the verb of a discarded line, so the host still gets an answer.
+        """
+        self._stream = stream
+        self._on_line = on_line
+        self._on_overflow = on_overflow
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._length = 0
+        self._overflow = False
+        self._overflow_verb = ""
+        self.budget_ns = int(budget_ms * 1_000_000)
+
+    def poll(self):
+        """
+        Read whatever is waiting without blocking and execute complete lines until the budget runs out.
+        Lines left over stay buffered for the next poll.
+        :return: The number of lines executed.
+        """
+        stream = self._stream
+        waiting = stream.in_waiting
+        if waiting and self._length < len(self._buffer):
+            count = min(waiting, len(self._buffer) - self._length)
+            self._length += stream.readinto(self._view[self._length:self._length + count]) or 0
+
+        if not self._length:
+            return 0
+
+        executed = 0
+        deadline = time.monotonic_ns() + self.budget_ns
+        while self._length:
+            end = self._find_terminator()
+            if end < 0:
+                if self._length == len(self._buffer):
+                    # Line longer than the buffer: drop it up to the next terminator
+                    if not self._overflow:
+                        self._overflow_verb = self._verb()
+                    self._length = 0
+                    self._overflow = True
+                break
+
+            line = bytes(self._view[:end])
+            self._consume(end + 1)
+            if self._overflow:
+                self._overflow = False
+                if self._on_overflow:
+                    self._on_overflow(self._overflow_verb)
+                else:
+                    print(f"Serial line too long: {self._overflow_verb}")
+                executed += 1
+                continue
+
+            line = line.strip()
+            if line:
+                try:
+                    self._on_line(line.decode("utf-8"))
+                except Exception as e:
+                    print(f"Error processing serial line: {e}")
+                executed += 1
+            if time.monotonic_ns() >= deadline:
+                break
+        return executed
+
+    def _verb(self):
+        # The verb ends at the first separator, as in serial_commands.CommandDispatcher.tokenize
+        head = bytes(self._view[:min(self._length, 32)]).replace(b" ", b":").lstrip(b":")
+        try:
+            return head.split(b":", 1)[0].decode("utf-8")
+        except UnicodeError:
+            return ""
+
+    def _find_terminator(self):
+        newline = self._buffer.find(b"\n", 0, self._length)
+        carriage_return = self._buffer.find(b"\r", 0, self._length)
+        if newline < 0 or 0 <= carriage_return < newline:
+            return carriage_return
+        return newline
+
+    def _consume(self, count):
+        remaining = self._length - count
+        if remaining:
+            self._buffer[:remaining] = self._buffer[count:self._length]
+        self._length = remaining
@@ -9,63 +9,101 @@
 * Author(s): Dan Halbert
 """
 
+import struct
 import time
 
 from adafruit_hid import find_device
+
+try:
+    import supervisor
+except ImportError:
+    supervisor = None
+
+
 class Gamepad:
-    def __init__(self, devices):
-        """Create a Gamepad object that will send USB gamepad HID reports."""
-        self._gamepad_device = find_device(devices, usage_page=0x1, usage=0x05)
+    def __init__(self, devices, wait=True, axes=3):
+        """Create a Gamepad object that will send USB gamepad HID reports.
+
+        :param devices: The usb_hid devices to search for the gamepad.
+        :param wait: Block until USB is ready. When False, the device is attached on the first
+                     send after the host has enumerated, and reports before that are dropped.
+        :param axes: Number of axes in the report descriptor built by simple.boot.
+        """
+        self._devices = devices
+        self._gamepad_device = None
 
         # Reuse this bytearray to send gamepad reports.
-        # Report structure:
-        #   Byte 0: RX
-        #   Byte 1: RY
-        #   Byte 2: RZ
-        self._report = bytearray(3)
+        # Report structure: one little-endian 16-bit value per axis, in descriptor order
+        self._format = f"<{axes}H"
+        self._report = bytearray(2 * axes)
 
         # Remember the last report as well, so we can avoid sending duplicate reports.
-        self._last_report = bytearray(3)
+        self._last_report = bytearray(2 * axes)
 
         # Store axis states separately for easier manipulation.
-        self._rx = 0
-        self._ry = 0
-        self._rz = 0
+        self._axes = [0] * axes
+
+        if wait:
+            self._gamepad_device = find_device(devices, usage_page=0x1, usage=0x05)
+            # Send an initial report to test if HID device is ready.
+            # If not, wait a bit and try once more.
+            try:
+                self.reset_all()
+            except OSError:
+                time.sleep(1)
+                self.reset_all()
+        else:
+            self.attach()
 
-        # Send an initial report to test if HID device is ready.
-        # If not, wait a bit and try once more.
+    @property
+    def attached(self):
+        """True once the HID device has been found and accepted a report."""
+        return self._gamepad_device is not None
+
+    def attach(self):
+        """Attach to the HID device if USB is ready, without blocking.
+
+        :return: True if the gamepad is attached.
+        """
+        if self._gamepad_device is not None:
+            return True
+        if supervisor is not None and not supervisor.runtime.usb_connected:
+            return False
         try:
-            self.reset_all()
-        except OSError:
-            time.sleep(1)
-            self.reset_all()
-
-    def set_axes(self, rx, ry, rz):
-        """Set the RX, RY, and RZ axis values (0-255)."""
-        self._rx = self._validate_axis_value(rx)
-        self._ry = self._validate_axis_value(ry)
-        self._rz = self._validate_axis_value(rz)
+            # USB is connected, so this returns without waiting
+            self._gamepad_device = find_device(self._devices, usage_page=0x1, usage=0x05)
+            # Push the current axis state straight away, without the busy retries
+            self._send(always=True, retries=1)
+        except (ValueError, OSError):
+            # HID device or host not ready for reports yet, try again on the next send
+            self._gamepad_device = None
+            return False
+        return True
+
+    def set_axis(self, index, value):
+        """Set one axis value (0-65535) without sending a report."""
+        self._axes[index] = self._validate_axis_value(value)
+
+    def set_axes(self, *values):
+        """Set every axis value (0-65535), in descriptor order, and send the report."""
+        axes = self._axes
+        for index, value in enumerate(values):
+            axes[index] = self._validate_axis_value(value)
+        if self._gamepad_device is None and not self.attach():
+            return
         self._send()
 
     def reset_all(self):
-        self._rx = 0
-        self._ry = 0
-        self._rz = 0
+        self._axes = [0] * len(self._axes)
         time.sleep(0.05)  # Short delay to prevent USB busy state
         self._send(always=True)
 
-    def _send(self, always=False):
-        # Pack RX, RY, RZ axes into the HID report
-        self._report[0] = self._rx
-        self._report[1] = self._ry
-        self._report[2] = self._rz
-
-        # Debug print to verify the report content
-        print(f"Sending HID report: {self._report.hex()}")
+    def _send(self, always=False, retries=3):
+        # Pack the axes into the HID report
+        struct.pack_into(self._format, self._report, 0, *self._axes)
 
         # Retry logic for USB busy state
-        retry_count = 3
-        for attempt in range(retry_count):
+        for attempt in range(retries):
             try:
                 # Only send the report if it has changed, unless `always` is True
                 if always or self._last_report != self._report:
@@ -73,7 +111,7 @@ class Gamepad:
                     self._last_report[:] = self._report
                 break
             except OSError as e:
-                if attempt < retry_count - 1:
+                if attempt < retries - 1:
                     print(f"USB busy, retrying... (attempt {attempt + 1})")
                     time.sleep(0.05)  # Short delay before retrying
                 else:
@@ -82,6 +120,6 @@ class Gamepad:
 
     @staticmethod
     def _validate_axis_value(value):
-        if not 0 <= value <= 255:
-            raise ValueError("Axis value must be in range 0 to 255")
+        if not 0 <= value <= 65535:
+            raise ValueError("Axis value must be in range 0 to 65535")
         return value
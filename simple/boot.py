@@ -2,26 +2,42 @@
 # It may not suit your needs, or be supported on your host computer.
 import usb_hid
 
-GAMEPAD_REPORT_DESCRIPTOR = bytes([
-    0x05, 0x01,        # Usage Page (Generic Desktop Controls)
-    0x09, 0x05,        # Usage (Gamepad)
-    0xA1, 0x01,        # Collection (Application)
-    0x15, 0x00,        # Logical Minimum (0)
-    0x26, 0xFF, 0x00,  # Logical Maximum (255)
-    0x75, 0x08,        # Report Size (8 bits)
-    0x95, 0x03,        # Report Count (3 fields: RX, RY, RZ)
-    0x09, 0x33,        # Usage (RX - Rotation about X-axis)
-    0x09, 0x34,        # Usage (RY - Rotation about Y-axis)
-    0x09, 0x35,        # Usage (RZ - Rotation about Z-axis)
-    0x81, 0x02,        # Input (Data, Variable, Absolute)
-    0xC0               # End Collection
-])
+from pedal_registry import AXIS_USAGES
 
-gamepad_descriptor = usb_hid.Device(
-    report_descriptor=GAMEPAD_REPORT_DESCRIPTOR,
-    usage_page=0x01,        # Generic Desktop Controls
-    usage=0x05,             # Gamepad
-    report_ids=(1,),        # Report ID is 1
-    in_report_lengths=(3,), # 3 bytes: RX, RY, RZ
-    out_report_lengths=(0,) # No output reports
-)
+
+def gamepad_report_descriptor(axes):
+    """
+    Build a gamepad report descriptor with one 16-bit axis (0-65535) per entry of axes, in order.
+    :param axes: Axis names from pedal_registry.AXIS_USAGES, e.g. ["rx", "ry", "rz"].
+    """
+    descriptor = bytearray([
+        0x05, 0x01,                    # Usage Page (Generic Desktop Controls)
+        0x09, 0x05,                    # Usage (Gamepad)
+        0xA1, 0x01,                    # Collection (Application)
+        0x85, 0x01,                    # Report ID (1)
+        0x15, 0x00,                    # Logical Minimum (0)
+        0x27, 0xFF, 0xFF, 0x00, 0x00,  # Logical Maximum (65535)
+        0x75, 0x10,                    # Report Size (16 bits)
+        0x95, len(axes),               # Report Count (one field per axis)
+    ])
+    for axis in axes:
+        descriptor += bytes([0x09, AXIS_USAGES[axis]])  # Usage (axis)
+    descriptor += bytes([
+        0x81, 0x02,                    # Input (Data, Variable, Absolute)
+        0xC0,                          # End Collection
+    ])
+    return bytes(descriptor)
+
+
+def gamepad_device(axes):
+    """
+    Create the gamepad HID device for the given axes.
+    """
+    return usb_hid.Device(
+        report_descriptor=gamepad_report_descriptor(axes),
+        usage_page=0x01,                     # Generic Desktop Controls
+        usage=0x05,                          # Gamepad
+        report_ids=(1,),                     # Report ID is 1
+        in_report_lengths=(2 * len(axes),),  # 2 bytes per axis
+        out_report_lengths=(0,)              # No output reports
+    )
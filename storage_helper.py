@@ -1,15 +1,28 @@
 import json
-from gpio_utils import GPIO_MAP, check_pinout  # Import the GPIO utilities
+from record_store import RecordStore
+
+# Frequently tuned per-pedal values kept in the record store instead of settings.json
+RECORD_FIELDS = ("calibration", "output_map", "tare")
 
 class Storage_Helper:
-    def __init__(self, settings_file="settings.json", default_file="default.json"):
+    def __init__(self, settings_file="settings.json", default_file="default.json", profiles_file="profiles.json",
+                 records_file="records.bin"):
         """
-        Initialize the Storage class with file paths for settings and defaults.
-        Cache the contents of settings.json for quick access.
+        Initialize the Storage class with file paths for settings, defaults, profiles and records.
+        Cache the contents of settings.json, overlaid with the newest records, for quick access.
         """
         self.settings_file = settings_file
         self.default_file = default_file
+        self.profiles_file = profiles_file
+        self.records = RecordStore(records_file)
         self._cache = self._load_cache()
+        self._profiles = None
+        # When deferred, writes only update the caches and mark them dirty; flush() writes them later
+        self.deferred = False
+        self._dirty = False
+        self._clear_records = False
+        self._pending_records = {}  # key -> newest values not yet written to the record store
+        self._profiles_dirty = False
 
     def _load_cache(self):
         """
@@ -18,11 +31,27 @@ class Storage_Helper:
         """
         try:
             with open(self.settings_file, "r") as f:
-                return json.load(f)
+                data = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             # Handle missing or corrupted JSON gracefully
             return {}
 
+        # Records are newer than the JSON document, so they take precedence
+        for name, config in data.items():
+            if not isinstance(config, dict) or "input" not in config:
+                continue
+            for field in RECORD_FIELDS:
+                values = self.records.read(f"{name}.{field}")
+                if values is not None:
+                    config[field] = values[0] if field == "tare" else values
+        return data
+
+    def reload(self):
+        """
+        Re-read the settings file into the cache, e.g. after it was changed externally.
+        """
+        self._cache = self._load_cache()
+
     def read_from_file(self, file_path, key=None):
         """
         Read data from a JSON file. If a key is provided, return its value.
@@ -65,6 +94,8 @@ class Storage_Helper:
                 default_data = json.load(f)
             with open(self.settings_file, "w") as f:
                 json.dump(default_data, f, indent=4)
+            self.records.clear()
+            self._pending_records = {}
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Default file '{self.default_file}' is missing!") from e
 
@@ -105,11 +136,83 @@ class Storage_Helper:
         current[keys[-1]] = value
 
         # Write the updated settings back to the file
+        self._save()
+
+    def write_settings(self, settings):
+        """
+        Replace the whole settings document with a single write.
+        The records are cleared because the document now holds the newest values.
+        :param settings: The complete settings dictionary.
+        """
+        self._cache = settings
+        self._clear_records = True
+        # The document holds the values of records that were still waiting to be written
+        self._pending_records = {}
+        self._save()
+
+    def _save(self):
+        """
+        Write the cache to the settings file now, or just mark it dirty while writes are deferred.
+        """
+        if self.deferred:
+            self._dirty = True
+        else:
+            self._write_cache()
+
+    def _write_cache(self):
         try:
             with open(self.settings_file, "w") as f:
                 json.dump(self._cache, f, indent=4)
         except OSError as e:
             print(f"Error writing settings file: {e}")
+            return False
+        # Only drop the records once the document holding their values is on flash
+        if self._clear_records:
+            self.records.clear()
+            self._clear_records = False
+        return True
+
+    def flush(self):
+        """
+        Write deferred changes to flash: the settings file, the newest record of each changed key
+        and the profiles file, coalescing any number of changes into one write each.
+        :return: True if anything was written.
+        """
+        written = False
+        if self._dirty:
+            self._dirty = not self._write_cache()
+            written = not self._dirty
+        if self._pending_records:
+            pending = self._pending_records
+            self._pending_records = {}
+            for key, values in pending.items():
+                self.records.write(key, values)
+            written = True
+        if self._profiles_dirty:
+            self._profiles_dirty = False
+            self._write_profiles()
+            written = True
+        return written
+
+    def write_record(self, key, value):
+        """
+        Store a frequently changing value (calibration, output map, tare) as a small record
+        instead of rewriting settings.json. The cache is updated so reads see the new value; while
+        writes are deferred, flush() writes the record.
+        :param key: A "<pedal>.<field>" key, e.g. "brake.calibration".
+        :param value: A list of up to 6 integers, or a single integer.
+        """
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if self.deferred:
+            self._pending_records[key] = list(values)
+        else:
+            self.records.write(key, values)
+
+        keys = key.split(".")
+        current = self._cache
+        for k in keys[:-1]:
+            current = current.setdefault(k, {})
+        current[keys[-1]] = value
 
     def read_from_defaults(self, key=None):
         """
@@ -119,10 +222,73 @@ class Storage_Helper:
         """
         return self.read_from_file(self.default_file, key)
 
+    ### Named Profiles ###
+    def read_profiles(self):
+        """
+        Read the profile store, loading it from the profiles file on first access.
+        :return: A dictionary with "active" (profile name or None) and "profiles" (name -> per-pedal settings).
+        """
+        if self._profiles is None:
+            data = self.read_from_file(self.profiles_file) or {}
+            self._profiles = {"active": data.get("active"), "profiles": data.get("profiles", {})}
+        return self._profiles
+
+    def _save_profiles(self):
+        """
+        Write the profile store now, or just mark it dirty while writes are deferred.
+        """
+        if self.deferred:
+            self._profiles_dirty = True
+        else:
+            self._write_profiles()
+
+    def _write_profiles(self):
+        try:
+            with open(self.profiles_file, "w") as f:
+                json.dump(self._profiles, f)
+        except OSError as e:
+            print(f"Error writing profiles file: {e}")
+
+    def write_profile(self, name, profile):
+        """
+        Store a named profile.
+        :param name: The profile name.
+        :param profile: Dictionary mapping pedal names to their curve, calibration, filter and inversion settings.
+        """
+        self.read_profiles()["profiles"][name] = profile
+        self._save_profiles()
+
+    def delete_profile(self, name):
+        """
+        Remove a named profile. Clears the active profile if it was the one removed.
+        """
+        store = self.read_profiles()
+        if store["profiles"].pop(name, None) is not None:
+            if store["active"] == name:
+                store["active"] = None
+            self._save_profiles()
+
+    def set_active_profile(self, name):
+        """
+        Remember which profile is active so it is restored at boot.
+        """
+        store = self.read_profiles()
+        if store["active"] != name:
+            store["active"] = name
+            self._save_profiles()
+
+    def get_active_profile(self):
+        """
+        Return the name of the active profile, or None.
+        """
+        return self.read_profiles()["active"]
+
     def validate_pinout(self):
         """
         Validate the pinout configuration using the GPIO map.
         """
+        from gpio_utils import check_pinout  # Only needed when validating
+
         settings = self.read_from_settings()
         if not settings:
             print("Error: No settings found. Unable to validate pinout.")
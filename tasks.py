@@ -0,0 +1,130 @@
+# tasks.py
+
+import time
+import asyncio
+from boot_trace import boot_trace
+
+# Task intervals in milliseconds; a shorter interval means the task runs more often.
+# "hid" should match the polling interval of the HID endpoint: reporting faster only repeats data.
+# Samplers are paced per input type: analog pins run on every scheduler pass (kHz rates),
+# the ADS1115 tops out at 860 samples/s and the HX711 delivers 80 samples/s.
+DEFAULT_INTERVALS = {
+    "hid": 1,
+    "serial": 5,
+    "telemetry": 10,
+    "storage": 1000,
+    "i2c": 1,
+    "Analog": 0,
+    "ADS": 1,
+    "Loadcell": 12,
+}
+
+
+class PedalTasks:
+    """
+    Runs the pedal box as cooperative asyncio tasks instead of one serial loop:
+    a sampler per enabled pedal, a HID reporter, a serial command task, a telemetry task, a
+    deferred storage writer and, with an I2C bus, its recovery task. Each task yields after
+    every step, so a slow sensor only delays itself and never the HID cadence.
+    Flash writes are batched into the storage task, which runs once a second; a write itself is
+    synchronous and blocks the event loop while it lasts.
+
+    Intervals can be overridden in settings.json, e.g. "tasks": {"hid": 1, "Loadcell": 12}.
+    """
+
+    def __init__(self, pedals):
+        """
+        :param pedals: The configured Pedals instance.
+        """
+        self.pedals = pedals
+        self.intervals = dict(DEFAULT_INTERVALS)
+        self.intervals.update(pedals.storagehelper.read_from_settings("tasks") or {})
+        self._samplers = {}  # pedal name -> sampler task
+
+    async def every(self, interval_ms, step, name):
+        """
+        Call step() every interval_ms, keeping to a fixed schedule. When a step overruns, the
+        schedule restarts from now instead of running back-to-back to catch up.
+        """
+        interval_ns = int(interval_ms * 1_000_000)
+        next_run = time.monotonic_ns()
+        while True:
+            try:
+                step()
+            except Exception as e:
+                print(f"Unhandled exception in {name} task: {e}")
+            next_run += interval_ns
+            delay = next_run - time.monotonic_ns()
+            if delay < 0:
+                next_run = time.monotonic_ns()
+                delay = 0
+            await asyncio.sleep(delay / 1_000_000_000)
+
+    async def sampler(self, name):
+        """
+        Read one pedal at the rate of its input. A load cell is only read once the HX711 has a
+        conversion ready, so waiting for it never blocks the other tasks.
+        """
+        pedal = self.pedals._pedals[name]["pedal"]
+        input_type = (self.pedals._applied.get(name, {}).get("input") or {}).get("type")
+        interval = self.intervals.get(input_type, 1)
+
+        def step():
+            if self.pedals._on_states[name] and pedal.input_ready():
+                self.pedals.sample(name, pedal)
+
+        await self.every(interval, step, name)
+
+    def report(self):
+        # Samplers only publish into the mailbox; this is the one place HID reports are sent
+        self.pedals.report()
+        if boot_trace.active and self.pedals.gamepad.attached:
+            boot_trace.finish()
+            print(boot_trace.report())
+
+    def serve(self):
+        if self.pedals._profile_button:
+            self.pedals.poll_profile_button()
+        self.pedals.serial_reader.poll()
+        # Settings changed by a command can enable a pedal, or change its input and so its rate
+        self.start_samplers()
+
+    def send_telemetry(self):
+        if self.pedals.telemetry.active:
+            self.pedals.telemetry.tick()
+
+    def poll_i2c(self):
+        # One short recovery step per pass while the bus is being freed
+        self.pedals.i2c_health.poll()
+
+    def flush_storage(self):
+        self.pedals.storagehelper.flush()
+
+    def start_samplers(self):
+        """
+        Start a sampler for every pedal that lacks one and restart those whose input type changed.
+        """
+        for name in self.pedals._pedals:
+            input_type = (self.pedals._applied.get(name, {}).get("input") or {}).get("type")
+            current = self._samplers.get(name)
+            if current is not None and current[0] == input_type:
+                continue
+            if current is not None:
+                current[1].cancel()
+            self._samplers[name] = (input_type, asyncio.create_task(self.sampler(name)))
+
+    async def run(self):
+        """
+        Start every task and run them forever. Flash writes are deferred to the storage task.
+        """
+        self.pedals.storagehelper.deferred = True
+        self.start_samplers()
+        tasks = [
+            self.every(self.intervals["hid"], self.report, "hid"),
+            self.every(self.intervals["serial"], self.serve, "serial"),
+            self.every(self.intervals["telemetry"], self.send_telemetry, "telemetry"),
+            self.every(self.intervals["storage"], self.flush_storage, "storage"),
+        ]
+        if self.pedals.i2c_health:
+            tasks.append(self.every(self.intervals["i2c"], self.poll_i2c, "i2c"))
+        await asyncio.gather(*tasks)
@@ -0,0 +1,90 @@
+# telemetry.py
+
+import time
+
+# Per-pedal values a host can subscribe to
+TELEMETRY_FIELDS = ("raw", "filtered", "before", "after", "timing")
+
+
+class Telemetry:
+    """
+    Host-subscribed pedal telemetry. Nothing is formatted or written unless a host has
+    subscribed with STREAM, so the loop only pays for one attribute check in normal driving.
+
+    Frames have the form TEL:<seq>,<ms>;<prefix>=<v>,<v>;<prefix>=<v>,<v>
+    with the values in the subscribed field order.
+    """
+
+    def __init__(self, stream):
+        """
+        :param stream: The serial port frames are written to.
+        """
+        self._stream = stream
+        self.active = False
+        self._pedals = []  # (prefix, Pedal) pairs
+        self._fields = ()
+        self._decimation = 1
+        self._countdown = 1
+        self.sequence = 0
+        self.dropped = 0
+
+    def subscribe(self, pedals, fields, decimation=1):
+        """
+        Start streaming.
+        :param pedals: List of (prefix, Pedal) pairs to include.
+        :param fields: Field names from TELEMETRY_FIELDS.
+        :param decimation: Send one frame every N loop iterations.
+        """
+        for field in fields:
+            if field not in TELEMETRY_FIELDS:
+                raise ValueError(f"unknown field {field}")
+        if decimation < 1:
+            raise ValueError("decimation must be at least 1")
+        self.stop()
+        self._pedals = pedals
+        self._fields = tuple(fields)
+        self._decimation = self._countdown = decimation
+        self.sequence = 0
+        self.dropped = 0
+        timed = "timing" in self._fields
+        for prefix, pedal in pedals:
+            pedal.timed = timed
+        self.active = True
+
+    def stop(self):
+        """
+        Stop streaming and turn off any per-pedal timing.
+        """
+        self.active = False
+        for prefix, pedal in self._pedals:
+            pedal.timed = False
+        self._pedals = []
+
+    def status(self):
+        """
+        Describe the subscription as STREAM:<prefixes>:<fields>:<decimation>:<sent>:<dropped>, or STREAM:OFF.
+        """
+        if not self.active:
+            return "STREAM:OFF"
+        prefixes = ",".join(prefix for prefix, pedal in self._pedals)
+        return f"STREAM:{prefixes}:{','.join(self._fields)}:{self._decimation}:{self.sequence}:{self.dropped}"
+
+    def tick(self):
+        """
+        Called once per loop iteration while active; sends every Nth frame if the port has room.
+        """
+        self._countdown -= 1
+        if self._countdown:
+            return
+        self._countdown = self._decimation
+
+        if self._stream.out_waiting:
+            # Host isn't keeping up; drop rather than block the loop
+            self.dropped += 1
+            return
+        self.sequence += 1
+        parts = [f"TEL:{self.sequence},{time.monotonic_ns() // 1_000_000}"]
+        for prefix, pedal in self._pedals:
+            values = ",".join(str(pedal.get_telemetry_value(field)) for field in self._fields)
+            parts.append(f"{prefix}={values}")
+        self._stream.write((";".join(parts) + "\n").encode("utf-8"))